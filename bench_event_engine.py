@@ -0,0 +1,56 @@
+import sys
+import time
+
+from simulator.config import cars_config, game_config
+from simulator.event_engine import EventSimulation, EventTraffic
+from simulator.lights_control.static import StaticLightsControl, StaticPhase
+from simulator.timer import VirtualClock
+from simulator.traffic import Traffic
+from simulator.world import World, create_world
+
+# usage: python bench_event_engine.py [cars_per_min] [green_s] [simulated_s]
+cars_per_min = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+green_s = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+simulated_s = int(sys.argv[3]) if len(sys.argv) > 3 else 3600
+
+
+def create_lights_control(world: World, clock: VirtualClock) -> StaticLightsControl:
+    lights = world.lights
+    return StaticLightsControl([
+        StaticPhase([lights["north_right"], lights["south_right"]], green_s // 2),
+        StaticPhase([lights["north_through"], lights["north_left"],
+                     lights["south_through"], lights["south_left"]], green_s),
+        StaticPhase([lights["west_right"], lights["east_right"]], green_s // 2),
+        StaticPhase([lights["west_through"], lights["west_left"],
+                     lights["east_through"], lights["east_left"]], green_s),
+    ], clock=clock)
+
+
+def bench(engine: str) -> tuple[float, Traffic]:
+    clock = VirtualClock(dt_ms=1000 / 60)
+    world = create_world(clock)
+    lights_control = create_lights_control(world, clock)
+    config = {**cars_config, "cars_per_min": cars_per_min}
+    start = time.perf_counter()
+    if engine == "event":
+        traffic: Traffic = EventTraffic(1, world.streets, config, game_config, clock=clock)
+        traffic.reset(seed=42)
+        EventSimulation(traffic, lights_control, clock).run_until(simulated_s * 1000)
+    else:
+        traffic = Traffic(1, world.streets, config, game_config, clock=clock)
+        traffic.reset(seed=42)
+        while clock.get_ticks() < simulated_s * 1000:
+            clock.advance()
+            lights_control.next_tick()
+            traffic.next_tick()
+    return time.perf_counter() - start, traffic
+
+
+if __name__ == "__main__":
+    print(f"[bench] {simulated_s}s simulated, {cars_per_min} cars/min, {green_s}s green")
+    base_s = None
+    for engine in ["tick", "event"]:
+        elapsed, traffic = bench(engine)
+        base_s = base_s or elapsed
+        print(f"[bench] engine={engine:5s} time={elapsed:7.3f}s speedup={base_s / elapsed:7.1f}x "
+              f"passed={traffic.calc_passed_cars()} finished={traffic.calc_finished_cars()}")
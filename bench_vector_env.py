@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import numpy as np
+
+from simulator.gym_env import TrafficSimulatorEnv
+from simulator.parallel import SharedMemoryVectorEnv
+from simulator.timer import set_clock
+
+# usage: python bench_vector_env.py [max_workers] [steps]
+max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+n_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+
+def make_env():
+    # spawned workers inherit nothing, configure the clock here
+    set_clock(speed=3, dt_ms=1000 / 60)
+    return TrafficSimulatorEnv(render_mode=None, engine="object")
+
+
+def bench(num_workers: int) -> float:
+    envs = SharedMemoryVectorEnv([make_env] * num_workers)
+    rng = np.random.default_rng(0)
+    envs.reset(seed=42)
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        envs.step(rng.integers(0, 4, num_workers))
+    elapsed = time.perf_counter() - start
+    envs.close()
+    return num_workers * n_steps / elapsed
+
+
+if __name__ == "__main__":
+    workers = [1]
+    while workers[-1] * 2 <= max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != max_workers:
+        workers.append(max_workers)
+
+    print(f"[bench] {n_steps} steps per worker, {os.cpu_count()} cores")
+    base_sps = None
+    for num_workers in workers:
+        sps = bench(num_workers)
+        base_sps = base_sps or sps
+        print(f"[bench] workers={num_workers:3d} steps/s={sps:10.1f} speedup={sps / base_sps:5.2f}x")
@@ -1,9 +1,10 @@
 # run last saved q_table
+import os
 from simulator import config
-from simulator.timer import set_clock, clock
+from simulator.timer import set_clock
 import gymnasium as gym
 from gymnasium.envs.registration import register
-from simulator.gym_q_agent import TrafficLightQAgent
+from simulator.gym_q_agent import DenseTrafficLightQAgent, TrafficLightQAgent
 
 set_clock(speed=1)  # initialize it
 config.game_config["FPS"] = 60
@@ -21,13 +22,26 @@ start_epsilon = 0
 epsilon_decay = start_epsilon / (n_episodes / 2)
 final_epsilon = 0.01
 
-agent = TrafficLightQAgent(
-    env=env,
-    learning_rate=learning_rate,
-    initial_epsilon=start_epsilon,
-    epsilon_decay=epsilon_decay,
-    final_epsilon=final_epsilon,
-)
+q_table_path = "./q_tables/q_table.qtab"
+if os.path.exists(q_table_path):
+    # memory-map the exported binary Q-table, no loading needed
+    agent = DenseTrafficLightQAgent(
+        env=env,
+        learning_rate=learning_rate,
+        initial_epsilon=start_epsilon,
+        epsilon_decay=epsilon_decay,
+        final_epsilon=final_epsilon,
+        q_table_path=q_table_path,
+        read_only=True,
+    )
+else:
+    agent = TrafficLightQAgent(
+        env=env,
+        learning_rate=learning_rate,
+        initial_epsilon=start_epsilon,
+        epsilon_decay=epsilon_decay,
+        final_epsilon=final_epsilon,
+    )
 
 obs, info = env.reset(seed=42)
 done = False
@@ -45,7 +59,7 @@ while not done:
 
 
 print("Total Reward:", total_reward)
-print("Simulation lasted:", int(clock().get_ticks()/1000), "seconds")
+print("Simulation lasted:", int(env.unwrapped.world.clock.get_ticks()/1000), "seconds")  # type: ignore
 
 
 env.close()
@@ -1,20 +1,38 @@
 import gymnasium as gym
-import statistics
 from gymnasium.envs.registration import register
 from tqdm import tqdm
-import numpy as np
 import datetime
+import os
+import subprocess
+import sys
 
+from simulator import log
+from simulator.gym_env import TrafficSimulatorEnv
 from simulator.gym_q_agent import TrafficLightQAgent
 from simulator.timer import set_clock
-from utils.plot_metrics import plot_metrics
-
-# initialize it to 3x speed
-set_clock(speed=3)
-
-
+from simulator.warm_start import WarmStartPool
+from utils.metrics import EWMA, MetricsLog, RingBuffer
+
+# per-step records are DEBUG, only episode summaries go to the terminal and training_logs/train.log
+os.makedirs("training_logs", exist_ok=True)
+log.configure(level=log.INFO, path="training_logs/train.log")
+logger = log.get_logger("train")
+
+# initialize it to 3x speed, simulated time advances 1/60s per env step
+set_clock(speed=3, dt_ms=1000 / 60)
+
+
+# usage: python gym_train.py [--watch] [--warm-start], --watch shows the training live without throttling it,
+# --warm-start starts episodes from pre-simulated traffic, built once into training_logs/warm_start/
+watch = "--watch" in sys.argv
+warm_start = None
+if "--warm-start" in sys.argv:
+    pool_env = TrafficSimulatorEnv()
+    warm_start = WarmStartPool.load_or_build(pool_env, folder="training_logs/warm_start/")
+    pool_env.close()
+reset_options = {"warm_start": True} if warm_start is not None else None
 register(id="traffic_light", entry_point="simulator.gym_env:TrafficSimulatorEnv")
-env = gym.make("traffic_light", render_mode="human")
+env = gym.make("traffic_light", render_mode="human" if watch else None, render_async=watch, warm_start=warm_start)
 
 # hyperparameters
 learning_rate = 0.1
@@ -35,14 +53,22 @@ agent = TrafficLightQAgent(
     final_epsilon=final_epsilon,
 )
 
-print(f"[train] {datetime.datetime.now().isoformat()} Training")  # noqa
-rewards_over_episodes: list[float] = []
-errors_over_episodes: list[float] = []
+# per-episode records go to disk in batches, only the recent window stays in memory
+metrics_folder = "training_logs/metrics/"
+metrics_log = MetricsLog(metrics_folder, ["episode", "mean_reward", "avg_error", "epsilon", "steps"])
+recent_rewards = RingBuffer(100)
+ewma_reward = EWMA(alpha=0.01)
+# a separate process re-plots training_logs/metrics.pdf from the log every 30s
+plotter = subprocess.Popen([sys.executable, "-m", "utils.plot_metrics", metrics_folder, "30"])
+
+logger.info("%s Training", datetime.datetime.now().isoformat())
 for episode in tqdm(range(n_episodes)):
-    obs, info = env.reset(seed=42)
+    # the seed picks the warm start state, a fixed one would start every episode from the same state
+    obs, info = env.reset(seed=42 + episode if warm_start is not None else 42, options=reset_options)
     done = False
 
-    episode_rewards: list[float] = []
+    episode_reward_sum = 0.0
+    episode_steps = 0
 
     # play one episode
     while not done:
@@ -56,23 +82,32 @@ for episode in tqdm(range(n_episodes)):
         done = terminated or truncated
         # done = terminated
         obs = next_obs
-        episode_rewards.append(float(reward))
+        episode_reward_sum += float(reward)
+        episode_steps += 1
 
         if done:
-            print(f'resetting (action={action}, reward={reward})', next_obs, info)  # noqa
-            observation, info = env.reset()
+            logger.info("resetting (action=%s, reward=%s) %s %s", action, reward, next_obs, info)
+            observation, info = env.reset(options=reset_options)
             # print(f'[train] {datetime.datetime.now().isoformat()} Resetting (action={action}, reward={reward})', obs, info)  # noqa
 
+    epsilon = agent.epsilon
     agent.decay_epsilon()
-    # Average training error over the last 100 episodes
-    avg_e_error = np.mean(agent.training_error[-100:])
-    avg_e_reward = statistics.mean(episode_rewards)
+    # Average training error over the last 100 steps
+    avg_e_error = agent.training_error.mean(100)
+    avg_e_reward = episode_reward_sum / max(1, episode_steps)
+    recent_rewards.append(avg_e_reward)
+    ewma_reward.update(avg_e_reward)
     # add time to print
-    print(f"[train] {datetime.datetime.now().isoformat()} Episode {episode}: Mean Reward = {avg_e_reward}, Average Training Error = {avg_e_error}")  # noqa
+    logger.info("%s Episode %d: Mean Reward = %s, Average Training Error = %s, Mean Reward (last 100) = %s, EWMA Reward = %s",  # noqa
+                datetime.datetime.now().isoformat(), episode, avg_e_reward, avg_e_error, recent_rewards.mean(), ewma_reward.value)  # noqa
     agent.save_q_table()
-    rewards_over_episodes.append(avg_e_reward)
-    errors_over_episodes.append(float(avg_e_error))
-    plot_metrics(rewards_over_episodes, errors_over_episodes, f'e{episode}')  # noqa
+    metrics_log.append({"episode": episode, "mean_reward": avg_e_reward, "avg_error": avg_e_error,
+                        "epsilon": epsilon, "steps": episode_steps})
 
 
+metrics_log.close()
+plotter.terminate()  # plots the last records before exiting
+plotter.wait()
+agent.export_q_table()
 env.close()
+agent.close()
@@ -0,0 +1,45 @@
+import datetime
+import os
+import sys
+
+from simulator import log
+from simulator.gym_env import TrafficSimulatorEnv
+from simulator.hogwild import HogwildQTrainer
+from simulator.timer import set_clock
+
+# usage: python gym_train_parallel.py [workers], defaults to one worker per core
+n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+
+# hyperparameters, same as gym_train.py
+learning_rate = 0.1
+n_episodes = 100_000
+start_epsilon = 1.0
+epsilon_decay = start_epsilon / n_episodes
+final_epsilon = 0.01
+
+q_table_path = "./q_tables/q_table.qtab"
+logger = log.get_logger("train")
+
+
+def make_env():
+    # initialize it to 3x speed, simulated time advances 1/60s per env step
+    set_clock(speed=3, dt_ms=1000 / 60)
+    return TrafficSimulatorEnv(render_mode=None)
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(q_table_path), exist_ok=True)
+    trainer = HogwildQTrainer(
+        make_env,
+        q_table_path,
+        num_workers=n_workers,
+        n_episodes=n_episodes,
+        learning_rate=learning_rate,
+        start_epsilon=start_epsilon,
+        epsilon_decay=epsilon_decay,
+        final_epsilon=final_epsilon,
+        seed=42,
+    )
+    logger.info("%s Training with %d workers", datetime.datetime.now().isoformat(), n_workers)
+    trainer.run()
+    logger.info("%s Done, Q-table in %s", datetime.datetime.now().isoformat(), q_table_path)
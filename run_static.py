@@ -34,7 +34,7 @@ def main():
     print('Rendering traffic conjunction...')
     lights_control = StaticLightsControl(lights_phases_config)
     traffic = Traffic(1, streets, cars_config, game_config)
-    environment = Environment(screen, streets)
+    environment = Environment(screen, streets, dirty_rects=True)
     while running:
         clock.tick(game_config["FPS"])
 
@@ -53,7 +53,7 @@ def main():
         if traffic.num_spawned_cars > 0 and len(traffic.all_cars) <= 0:
             environment.draw_dialog("All cars left")
 
-        pygame.display.update()
+        pygame.display.update(environment.dirty_rects)
     pygame.quit()
     sys.exit()
 
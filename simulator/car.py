@@ -1,8 +1,7 @@
-from random import randint
 from typing import Optional
 import random
 
-from simulator.timer import clock
+from simulator import timer
 
 
 class Car:
@@ -10,9 +9,15 @@ class Car:
     CAR_ID_COUNTER = 0
     start_delay_ms = 1000
 
-    def __init__(self, street, lane, to_street, to_intsec, game_config, init_speed=1) -> None:
+    def __init__(self, street, lane, to_street, to_intsec, game_config, init_speed=1,
+                 clock: Optional[timer.WorldClock] = None, rng: Optional[random.Random] = None) -> None:
+        """
+        clock and rng default to the global clock and random module
+        """
         self.id = Car.CAR_ID_COUNTER
         Car.CAR_ID_COUNTER += 1
+        self.clock = clock if clock is not None else timer.clock()
+        randint = rng.randint if rng is not None else random.randint
         # assign a random color to each car
         self.color = (randint(100, 200), randint(100, 200), randint(100, 200))
         self.init_speed = init_speed
@@ -25,11 +30,45 @@ class Car:
         self.travel_distance = 0  # travel unit, px for now
         self.updated_waiting_ms = 0
         self.width = 10  # car width
-        self.length = random.randint(15, 25)  # car length
+        self.length = randint(15, 25)  # car length
         self.drive_config = {
-            "front": random.randint(8, 12),  # car to car gap
+            "front": randint(8, 12),  # car to car gap
         }
         self.game_config = game_config
+        # trip accounting, see TripStats
+        self.movement = f"{street.approach_direction}_{lane.to_direction}"
+        self.spawned_ms = self.clock.get_ticks()
+        self.stops = 0
+        # time the whole trip takes at init speed without ever stopping
+        free_flow_distance = street.length + self.length + \
+            max(0, to_intsec.length - self.length) + \
+            to_street.length + self.length
+        self.free_flow_ms = free_flow_distance / init_speed * 1000
+        # the lane or intersection queue the car is in and its neighbours there, see CarQueue
+        self.queue = None
+        self.leader: Optional[Car] = None
+        self.follower: Optional[Car] = None
+
+    def get_snapshot(self) -> tuple:
+        """
+        What changes while the car drives, see #set_snapshot()
+        """
+        d = self.__dict__
+        return (self.current_speed, self.street, self.lane, self.to_street, self.in_intersection,
+                self.travel_distance, self.updated_waiting_ms, self.stops, self.queue, self.leader, self.follower,
+                d.get("last_clock_ms"), d.get("stopped_at_ms"), d.get("started_at_ms"))
+
+    def set_snapshot(self, state: tuple):
+        (self.current_speed, self.street, self.lane, self.to_street, self.in_intersection,
+         self.travel_distance, self.updated_waiting_ms, self.stops, self.queue, self.leader, self.follower,
+         last_clock_ms, stopped_at_ms, started_at_ms) = state
+        # optional attributes, absent until first set
+        for name, value in [("last_clock_ms", last_clock_ms), ("stopped_at_ms", stopped_at_ms),
+                            ("started_at_ms", started_at_ms)]:
+            if value is not None:
+                setattr(self, name, value)
+            elif name in self.__dict__:
+                delattr(self, name)
 
     def reset_travel_distance(self):
         self.travel_distance = 0
@@ -39,8 +78,21 @@ class Car:
         self.y = y
         self.rotate = rotate
 
+    def _set_speed(self, speed):
+        """
+        Keep the running KPIs of the lane (or intersection) queue in sync
+        """
+        if self.queue is not None:
+            self.queue.update_stopped(self.current_speed < 1, speed < 1)
+        self.current_speed = speed
+
+    def _set_waiting_ms(self, waiting_ms):
+        if self.queue is not None:
+            self.queue.update_waiting_ms(waiting_ms - self.updated_waiting_ms)
+        self.updated_waiting_ms = waiting_ms
+
     def _get_step_ms(self):
-        clock_ms = clock().get_ticks()
+        clock_ms = self.clock.get_ticks()
 
         if 'last_clock_ms' not in self.__dict__:
             self.last_clock_ms = clock_ms
@@ -59,43 +111,41 @@ class Car:
             approached_line = self.travel_distance >= (self.street.length - 8)
             if should_stop and approached_line:
                 # stop criteria: lane is red, travel distance is greater than street length - 8
-                self.stopped_at_ms = clock().get_ticks()
+                if not hasattr(self, "stopped_at_ms") and self.current_speed >= 1:
+                    self.stops += 1
+                self.stopped_at_ms = self.clock.get_ticks()
                 return
 
         # --- delay start for a little while
         # check if car is stopped
         if hasattr(self, "stopped_at_ms"):
             # switch to started, but do not moving yet.
-            self.started_at_ms = clock().get_ticks()
+            self.started_at_ms = self.clock.get_ticks()
             delattr(self, "stopped_at_ms")
             return
         if hasattr(self, "started_at_ms"):
-            if clock().get_ticks() - self.started_at_ms < self.start_delay_ms:
+            if self.clock.get_ticks() - self.started_at_ms < self.start_delay_ms:
                 return
             else:
                 delattr(self, "started_at_ms")
                 # continue to move the car
         # --- finished delay start
 
-        # detect car in front
-        front_car: Optional[Car] = None
-        for i, car in enumerate(self.lane.get_cars()):
-            if car == self:
-                if i == 0:
-                    front_car = None
-                else:
-                    front_car = self.lane.get_cars()[i - 1]
+        # detect car in front, cars in the intersection do not follow each other
+        front_car: Optional[Car] = None if self.in_intersection else self.leader
 
         # avoid collision
         if front_car:
             front_car_tail_pos = front_car.travel_distance - front_car.length
             distance_to_front_car = front_car_tail_pos - self.travel_distance
             if distance_to_front_car < self.drive_config["front"]:
-                self.current_speed = 0
+                if self.current_speed >= 1:
+                    self.stops += 1
+                self._set_speed(0)
             else:
-                self.current_speed = self.init_speed
+                self._set_speed(self.init_speed)
         else:
-            self.current_speed = self.init_speed
+            self._set_speed(self.init_speed)
 
         # forwards
         step_ms = self._get_step_ms()
@@ -103,9 +153,9 @@ class Car:
 
         # update car waiting time if car is not moving
         if self.current_speed < 1:
-            self.updated_waiting_ms += step_ms
+            self._set_waiting_ms(self.updated_waiting_ms + step_ms)
         else:
-            self.updated_waiting_ms = 0
+            self._set_waiting_ms(0)
 
         if self.in_intersection and self.travel_distance + self.length >= self.to_intsec.length:
             # leaving intersection
@@ -0,0 +1,357 @@
+from typing import Optional
+import random
+import numpy as np
+
+from simulator import timer
+from simulator.car import Car
+from simulator.street import Intersection, Lane, Street
+
+
+def _field(name: str, cast=float):
+    """
+    Property backed by `CarEngine.<name>[slot]`
+    """
+
+    def fget(self):
+        return cast(getattr(self.engine, name)[self.slot])
+
+    def fset(self, value):
+        getattr(self.engine, name)[self.slot] = value
+
+    return property(fget, fset)
+
+
+class ArrayCar(Car):
+    """
+    Thin view of a car stored in a CarEngine, for rendering and existing callers.
+    Kinematic state lives in the engine arrays, identity and routing stay on the object.
+    """
+    travel_distance = _field("travel")
+    current_speed = _field("speed")
+    init_speed = _field("init_speed")
+    updated_waiting_ms = _field("waiting")
+    length = _field("length", int)
+    in_intersection = _field("in_intsec", bool)
+    stops = _field("stops", int)
+
+    def __init__(self, engine: "CarEngine", slot: int, street, lane, to_street, to_intsec, game_config, init_speed=1,
+                 clock: Optional[timer.WorldClock] = None, rng: Optional[random.Random] = None) -> None:
+        self.engine = engine
+        self.slot = slot
+        super().__init__(street, lane, to_street, to_intsec, game_config, init_speed, clock, rng)
+        engine.gap[slot] = self.drive_config["front"]
+
+    def next_tick(self):
+        raise RuntimeError("ArrayCar is advanced by its CarEngine")
+
+
+class CarEngine:
+    """
+    Struct-of-arrays storage for every car of a Traffic, all cars are advanced with
+    one vectorized update per tick. Same driving rules as Car.next_tick, except that
+    every car sees the position of its front car from the start of the tick.
+    """
+    stop_line_offset = 8
+    # per-car arrays, see #_allocate()
+    car_arrays = ["alive", "lane", "intsec", "in_intsec", "exiting", "travel", "length", "gap", "speed",
+                  "init_speed", "waiting", "stops", "stopped_at", "started_at", "last_ms", "leader", "follower",
+                  "color"]
+
+    def __init__(self, capacity: int = 256):
+        self.lanes: list[Lane] = []
+        self.lane_index: dict[Lane, int] = {}
+        self.intsecs: list[Intersection] = []
+        self.intsec_index: dict[Intersection, int] = {}
+        self.lane_street_len = np.zeros(0)
+        self.lane_has_light = np.zeros(0, dtype=bool)
+        self.intsec_len = np.zeros(0)
+        # mirror of the lane queue KPIs, so many lanes can be read at once
+        self.lane_num_stopped = np.zeros(0, dtype=np.int64)
+        self.lane_waiting_ms = np.zeros(0)
+
+        self.capacity = 0
+        self.views: list[Optional[ArrayCar]] = []
+        self._allocate(capacity)
+        self.reset()
+
+    def _allocate(self, capacity: int):
+        """
+        Grow every car array to `capacity`, keeping existing values
+        """
+        def grow(arr: Optional[np.ndarray], dtype, fill, shape=()):
+            new = np.full((capacity, *shape), fill, dtype=dtype)
+            if arr is not None:
+                new[:len(arr)] = arr
+            return new
+
+        def get(name):
+            return self.__dict__.get(name)
+
+        self.alive = grow(get("alive"), bool, False)
+        self.lane = grow(get("lane"), np.int32, -1)
+        self.intsec = grow(get("intsec"), np.int32, -1)
+        self.in_intsec = grow(get("in_intsec"), bool, False)
+        self.exiting = grow(get("exiting"), bool, False)
+        self.travel = grow(get("travel"), np.float64, 0)
+        self.length = grow(get("length"), np.float64, 0)
+        self.gap = grow(get("gap"), np.float64, 0)
+        self.speed = grow(get("speed"), np.float64, 0)
+        self.init_speed = grow(get("init_speed"), np.float64, 0)
+        self.waiting = grow(get("waiting"), np.float64, 0)
+        self.stops = grow(get("stops"), np.int32, 0)
+        self.stopped_at = grow(get("stopped_at"), np.float64, np.nan)
+        self.started_at = grow(get("started_at"), np.float64, np.nan)
+        self.last_ms = grow(get("last_ms"), np.float64, np.nan)
+        self.leader = grow(get("leader"), np.int32, -1)
+        self.follower = grow(get("follower"), np.int32, -1)
+        # for headless rendering, see Rasterizer
+        self.color = grow(get("color"), np.uint8, 0, (3,))
+        self.views.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def reset(self):
+        self.alive[:] = False
+        self.views = [None] * self.capacity
+        # pop from the end, so low slots are used first
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.high_water = 0
+        self.lane_num_stopped[:] = 0
+        self.lane_waiting_ms[:] = 0
+
+    def get_snapshot(self) -> tuple:
+        """
+        Copies of the car arrays and slot bookkeeping, the lane and intersection registry is not part of it
+        """
+        return (tuple(getattr(self, name).copy() for name in self.car_arrays), list(self.views),
+                list(self.free_slots), self.high_water, self.lane_num_stopped.copy(), self.lane_waiting_ms.copy())
+
+    def set_snapshot(self, state: tuple):
+        arrays, views, free_slots, self.high_water, lane_num_stopped, lane_waiting_ms = state
+        for name, arr in zip(self.car_arrays, arrays):
+            setattr(self, name, arr.copy())
+        self.capacity = len(self.alive)
+        self.views = list(views)
+        self.free_slots = list(free_slots)
+        self.lane_num_stopped = lane_num_stopped.copy()
+        self.lane_waiting_ms = lane_waiting_ms.copy()
+
+    def reset_streets(self, streets: list[Street], cars: list[ArrayCar]):
+        """
+        Drop the cars of some streets only, for engines shared by several Traffic instances
+        """
+        for car in cars:
+            self._free(car.slot)
+        for st in streets:
+            for lane in st.approach_lanes + st.exit_lanes:
+                self.lane_num_stopped[self.lane_index[lane]] = 0
+                self.lane_waiting_ms[self.lane_index[lane]] = 0
+
+    def register_streets(self, streets: list[Street]):
+        """
+        Give every lane and intersection of the streets an index into the engine arrays
+        """
+        for st in streets:
+            for lane in st.approach_lanes + st.exit_lanes:
+                if lane in self.lane_index:
+                    continue
+                self.lane_index[lane] = len(self.lanes)
+                self.lanes.append(lane)
+                if lane.to_intsec is not None and lane.to_intsec not in self.intsec_index:
+                    self.intsec_index[lane.to_intsec] = len(self.intsecs)
+                    self.intsecs.append(lane.to_intsec)
+        self.lane_street_len = np.array([l.street.length for l in self.lanes], dtype=np.float64)  # noqa
+        self.lane_has_light = np.array([l.light is not None for l in self.lanes], dtype=bool)  # noqa
+        self.intsec_len = np.array([i.length for i in self.intsecs], dtype=np.float64)  # noqa
+        self.lane_num_stopped = np.array([l.get_queue_length() for l in self.lanes], dtype=np.int64)  # noqa
+        self.lane_waiting_ms = np.array([l.get_total_waiting_time() for l in self.lanes], dtype=np.float64)  # noqa
+
+    def spawn(self, street, lane: Lane, to_street, to_intsec: Intersection, game_config, init_speed=1,
+              clock: Optional[timer.WorldClock] = None, rng: Optional[random.Random] = None) -> ArrayCar:
+        if len(self.free_slots) == 0:
+            old_capacity = self.capacity
+            self._allocate(old_capacity * 2)
+            self.free_slots = list(range(self.capacity - 1, old_capacity - 1, -1))
+        slot = self.free_slots.pop()
+        self.high_water = max(self.high_water, slot + 1)
+
+        self.alive[slot] = True
+        self.lane[slot] = self.lane_index[lane]
+        self.intsec[slot] = self.intsec_index[to_intsec]
+        self.exiting[slot] = False
+        self.stopped_at[slot] = np.nan
+        self.started_at[slot] = np.nan
+        self.last_ms[slot] = np.nan
+        car = ArrayCar(self, slot, street, lane, to_street, to_intsec,
+                       game_config=game_config, init_speed=init_speed, clock=clock, rng=rng)
+        self.views[slot] = car
+        self.color[slot] = car.color
+        self._enter_lane(car, lane)
+        return car
+
+    def _free(self, slot: int):
+        self.alive[slot] = False
+        self.views[slot] = None
+        self.free_slots.append(slot)
+
+    def _enter_lane(self, car: ArrayCar, lane: Lane):
+        """
+        Append the car to the lane, its leader is the last car of the lane
+        """
+        tail = lane.get_cars().tail
+        leader = tail.slot if tail is not None else -1  # type: ignore
+        self.leader[car.slot] = leader
+        self.follower[car.slot] = -1
+        if leader >= 0:
+            self.follower[leader] = car.slot
+        lane_id = self.lane_index[lane]
+        self.lane[car.slot] = lane_id
+        self.lane_num_stopped[lane_id] += self.speed[car.slot] < 1
+        self.lane_waiting_ms[lane_id] += self.waiting[car.slot]
+        lane.add_car(car)
+
+    def _leave_lane(self, car: ArrayCar, lane: Lane):
+        """
+        Remove the car from the lane, its follower takes over its leader
+        """
+        slot = car.slot
+        leader, follower = self.leader[slot], self.follower[slot]
+        if follower >= 0:
+            self.leader[follower] = leader
+        if leader >= 0:
+            self.follower[leader] = follower
+        self.leader[slot] = -1
+        self.follower[slot] = -1
+        lane_id = self.lane_index[lane]
+        self.lane_num_stopped[lane_id] -= self.speed[slot] < 1
+        self.lane_waiting_ms[lane_id] -= self.waiting[slot]
+        lane.remove_car(car)
+
+    def next_tick(self, clock_ms: float, lane_stop: Optional[np.ndarray] = None) -> list[ArrayCar]:
+        """
+        Advance all cars to `clock_ms`, returns the cars that left the simulation.
+        lane_stop tells which lanes have a yellow or red light, read from the lights by default.
+        """
+        idx = np.flatnonzero(self.alive[:self.high_water])
+        if len(idx) == 0:
+            return []
+        self.intsec_len[:] = [i.length for i in self.intsecs]
+        if lane_stop is None:
+            lane_stop = self.lane_has_light.copy()
+            for i in np.flatnonzero(self.lane_has_light):
+                lane_stop[i] = self.lanes[i].light.color in ["yellow", "red"]  # type: ignore
+
+        # stop criteria: lane is red, travel distance is greater than street length - 8
+        lane = self.lane[idx]
+        hold = ~self.in_intsec[idx] & lane_stop[lane] & \
+            (self.travel[idx] >= self.lane_street_len[lane] - self.stop_line_offset)
+        held = idx[hold]
+        self.stops[held] += np.isnan(self.stopped_at[held]) & (self.speed[held] >= 1)
+        self.stopped_at[held] = clock_ms
+        idx = idx[~hold]
+
+        # --- delay start for a little while
+        # stopped cars switch to started, but do not move yet
+        was_stopped = ~np.isnan(self.stopped_at[idx])
+        self.started_at[idx[was_stopped]] = clock_ms
+        self.stopped_at[idx[was_stopped]] = np.nan
+        idx = idx[~was_stopped]
+        started_at = self.started_at[idx]
+        is_starting = ~np.isnan(started_at)
+        delaying = is_starting & (clock_ms - started_at < Car.start_delay_ms)
+        self.started_at[idx[is_starting & ~delaying]] = np.nan
+        idx = idx[~delaying]
+        # --- finished delay start
+        if len(idx) == 0:
+            return []
+
+        # avoid collision, cars in the intersection have no front car
+        in_intsec = self.in_intsec[idx]
+        leader = self.leader[idx]
+        has_front = (leader >= 0) & ~in_intsec
+        front_tail_pos = self.travel[leader] - self.length[leader]
+        too_close = has_front & (front_tail_pos - self.travel[idx] < self.gap[idx])
+        speed = np.where(too_close, 0.0, self.init_speed[idx])
+        was_stopped = self.speed[idx] < 1
+        self.stops[idx] += ~was_stopped & (speed < 1)
+        self.speed[idx] = speed
+
+        # forwards
+        last_ms = self.last_ms[idx]
+        step_ms = clock_ms - np.where(np.isnan(last_ms), clock_ms, last_ms)
+        self.last_ms[idx] = clock_ms
+        travel = self.travel[idx] + speed * (step_ms / 1000)
+        self.travel[idx] = travel
+
+        # update car waiting time if car is not moving
+        waiting = self.waiting[idx]
+        new_waiting = np.where(speed < 1, waiting + step_ms, 0)
+        self.waiting[idx] = new_waiting
+        self._update_queue_kpis(idx, in_intsec, (speed < 1).astype(np.int64) - was_stopped,
+                                new_waiting - waiting)
+
+        length = self.length[idx]
+        leave_intsec = idx[in_intsec & (
+            travel + length >= self.intsec_len[self.intsec[idx]])]
+        leave_street = idx[~in_intsec & (
+            travel - length >= self.lane_street_len[self.lane[idx]])]
+
+        for slot in leave_intsec:
+            self._leave_intersection(self.views[slot])  # type: ignore
+        finished_cars: list[ArrayCar] = []
+        for slot in leave_street:
+            car: ArrayCar = self.views[slot]  # type: ignore
+            if self._leave_street(car):
+                finished_cars.append(car)
+        return finished_cars
+
+    def _update_queue_kpis(self, idx: np.ndarray, in_intsec: np.ndarray, delta_stopped: np.ndarray,
+                           delta_waiting_ms: np.ndarray):
+        """
+        Apply the per-car changes to the running KPIs of the queues the cars are in, see CarQueue
+        """
+        for queues, ids, mask in [(self.lanes, self.lane, ~in_intsec), (self.intsecs, self.intsec, in_intsec)]:
+            queue_ids = ids[idx[mask]]
+            stopped = np.bincount(queue_ids, weights=delta_stopped[mask], minlength=len(queues))  # noqa
+            waiting = np.bincount(queue_ids, weights=delta_waiting_ms[mask], minlength=len(queues))  # noqa
+            for i in np.flatnonzero((stopped != 0) | (waiting != 0)):
+                queue = queues[i].cars
+                queue.num_stopped += int(stopped[i])
+                queue.total_waiting_ms += waiting[i]
+            if queues is self.lanes:
+                self.lane_num_stopped += stopped.astype(np.int64)
+                self.lane_waiting_ms += waiting
+
+    def _leave_intersection(self, car: ArrayCar):
+        if car.to_street is None:
+            raise ValueError("Car should have to_street at this point")
+        slot = car.slot
+        self.in_intsec[slot] = False
+        car.to_intsec.remove_car(car)
+
+        # move car to next street
+        car.street = car.to_street
+        car.to_street = None  # leaves the simulation
+        car.lane = car.to_intsec.to_lane
+        self.exiting[slot] = True
+        self.travel[slot] = 0
+        self._enter_lane(car, car.lane)
+
+    def _leave_street(self, car: ArrayCar) -> bool:
+        """
+        Returns True if the car is out of the simulation
+        """
+        slot = car.slot
+        self._leave_lane(car, car.lane)
+        if self.exiting[slot]:
+            self._free(slot)
+            return True
+
+        # move to intersection
+        self.in_intsec[slot] = True
+        car.to_intsec.add_car(car)
+        car.street = None
+        self.travel[slot] = 0
+        return False
+
+    def __len__(self):
+        return self.capacity - len(self.free_slots)
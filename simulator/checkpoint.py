@@ -0,0 +1,148 @@
+import glob
+import os
+import pickle
+import queue
+import threading
+from typing import Any, Optional
+
+
+class QTableCheckpointer:
+    """
+    Incremental checkpoints of a Q-table kept as a dict of state -> Q-values.
+    #save() only takes the entries changed since the last save, a background thread appends
+    them to a delta log and every `compact_every` saves compacts everything into a new snapshot.
+    Snapshots are written to a temporary file and renamed into place, the last `keep` snapshots
+    and their delta logs are kept, so an interruption always leaves a loadable checkpoint.
+
+    Folder layout, <seq> increases with every snapshot:
+    - <seq>.snapshot.pkl: the full table
+    - <seq>.delta.log: pickled {state: Q-values} records appended on top of snapshot <seq>
+    """
+    snapshot_suffix = ".snapshot.pkl"
+    delta_suffix = ".delta.log"
+
+    def __init__(self, folder="./q_tables/", keep=3, compact_every=100):
+        self.folder = folder
+        self.keep = keep
+        self.compact_every = compact_every
+        os.makedirs(folder, exist_ok=True)
+
+        # the writer thread owns a replica of the saved table, compaction never touches the live table
+        self.replica: dict = {}
+        self.loaded = False
+        self.seq = 0
+        self.num_deltas = 0
+        self.error: Optional[BaseException] = None
+        self.queue: queue.Queue = queue.Queue()
+        # started by the first #save(), loading only needs no writer
+        self.thread: Optional[threading.Thread] = None
+
+    def _path(self, seq: int, suffix: str):
+        return os.path.join(self.folder, f"{seq:08d}{suffix}")
+
+    def _seqs(self) -> list[int]:
+        files = glob.glob(os.path.join(self.folder, "*" + self.snapshot_suffix))
+        return sorted(int(os.path.basename(f)[:-len(self.snapshot_suffix)]) for f in files)
+
+    def load(self) -> Optional[dict]:
+        """
+        Load the newest snapshot with its delta log, None if there is no checkpoint
+        """
+        self.loaded = True
+        for seq in reversed(self._seqs()):
+            try:
+                with open(self._path(seq, self.snapshot_suffix), "rb") as f:
+                    table = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                continue  # damaged, fall back to the previous one
+            delta_path = self._path(seq, self.delta_suffix)
+            num_deltas = 0
+            if os.path.exists(delta_path):
+                with open(delta_path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    while True:
+                        record_start = f.tell()
+                        try:
+                            table.update(pickle.load(f))
+                            num_deltas += 1
+                        except (EOFError, pickle.UnpicklingError):
+                            if record_start < size:
+                                # a record cut short by an interruption, compact before appending again
+                                num_deltas = self.compact_every
+                            break
+            # copies of the rows, the caller updates the loaded rows in place while the writer pickles the replica
+            self.replica = {state: values.copy() for state, values in table.items()}
+            self.seq = seq
+            self.num_deltas = num_deltas
+            return table
+        return None
+
+    def save(self, changes: dict[Any, Any]):
+        """
+        Queue the changed entries, values must not be modified afterwards (pass copies)
+        """
+        if self.error is not None:
+            raise self.error
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="QTableCheckpointer", daemon=True)
+            self.thread.start()
+        self.queue.put(changes)
+
+    def flush(self):
+        """
+        Wait until every queued save is on disk
+        """
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            changes = self.queue.get()
+            try:
+                if changes is None:
+                    return
+                if self.error is None:
+                    self._write(changes)
+            except BaseException as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _write(self, changes: dict):
+        if not self.loaded:
+            # saving into a folder with earlier checkpoints, continue on top of them
+            self.load()
+        self.replica.update(changes)
+        if self.num_deltas >= self.compact_every or not os.path.exists(self._path(self.seq, self.snapshot_suffix)):  # noqa
+            self._compact()
+            return
+        with open(self._path(self.seq, self.delta_suffix), "ab") as f:
+            pickle.dump(changes, f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.num_deltas += 1
+
+    def _compact(self):
+        seq = self.seq + 1
+        path = self._path(seq, self.snapshot_suffix)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.replica, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.seq = seq
+        self.num_deltas = 0
+
+        for old_seq in self._seqs()[:-self.keep]:
+            for suffix in [self.snapshot_suffix, self.delta_suffix]:
+                if os.path.exists(self._path(old_seq, suffix)):
+                    os.remove(self._path(old_seq, suffix))
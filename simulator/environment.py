@@ -1,12 +1,14 @@
+from typing import Optional
 import pygame
 import math
+from simulator import log, timer
 from simulator.car import Car
-from simulator.timer import clock
+from simulator.geometry import approach_width_ratio, lane_widths, layout
+from simulator.sprite_cache import SpriteCache
 
 from simulator.street import Lane, Street
 
-# Initialize font
-pygame.font.init()
+logger = log.get_logger("env")
 
 
 class Environment:
@@ -25,54 +27,103 @@ class Environment:
         "DIVIDER": (41, 96, 92),
     }
 
-    signs = {
-        "left_right": pygame.image.load('./icons/png/sign_left_right.png'),
-        "left_through_right": pygame.image.load('./icons/png/sign_through_right.png'),
-        "left_through": pygame.image.load('./icons/png/sign_left_through.png'),
-        "left": pygame.image.load('./icons/png/sign_left.png'),
-        "right": pygame.image.load('./icons/png/sign_right.png'),
-        "through_right": pygame.image.load('./icons/png/sign_through_right.png'),
-        "through": pygame.image.load('./icons/png/sign_through.png'),
+    # loaded on first use, so a headless simulation never touches fonts or images
+    signs: dict[str, pygame.Surface] = {}
+    sign_files = {
+        "left_right": './icons/png/sign_left_right.png',
+        "left_through_right": './icons/png/sign_through_right.png',
+        "left_through": './icons/png/sign_left_through.png',
+        "left": './icons/png/sign_left.png',
+        "right": './icons/png/sign_right.png',
+        "through_right": './icons/png/sign_through_right.png',
+        "through": './icons/png/sign_through.png',
     }
 
     font_size = 16
     font_path = "./fonts/Noto_Sans/NotoSans-VariableFont_wdth,wght.ttf"
-    lane_font = pygame.font.Font(font_path, font_size)  # Using a default font
+    lane_font: pygame.font.Font | None = None
 
-    approach_width_ratio = 0.6
+    approach_width_ratio = approach_width_ratio
 
-    def __init__(self, surface: pygame.Surface, roads_config: list[Street]):
+    # rendered and rotated once, shared by all environments
+    car_sprites = SpriteCache(2048)  # (width, length, color, rotate)
+    text_sprites = SpriteCache(256)  # (text, color, rotate)
+    sign_sprites = SpriteCache(64)  # (to_direction, rotate)
+
+    def __init__(self, surface: pygame.Surface, roads_config: list[Street], clock: Optional[timer.WorldClock] = None, dirty_rects=False):  # noqa
+        """
+        The static road layout is drawn once into a background surface, every frame blits it
+        and draws the lights, cars and text on top.
+        dirty_rects: only restore the background where the last frame drew, pass #dirty_rects
+        to pygame.display.update() to only update what changed
+        """
         self.surface = surface
+        self.clock = clock if clock is not None else timer.clock()
         self.roads_config = roads_config
+        self.use_dirty_rects = dirty_rects
+        self.background: Optional[pygame.Surface] = None
+        # areas drawn this frame, and restored from the background at the start of it
+        self.drawn_rects: list[pygame.Rect] = []
+        self.restored_rects: list[pygame.Rect] = []
+        # cars of this frame, drawn in one Surface.blits() call
+        self.car_blits: list[tuple[pygame.Surface, tuple[int, int]]] = []
+        Environment.load_assets()
+        layout(roads_config)
         self.next_tick()
 
+    @classmethod
+    def load_assets(cls):
+        if cls.lane_font is None:
+            # Initialize font
+            pygame.font.init()
+            cls.lane_font = pygame.font.Font(cls.font_path, cls.font_size)  # Using a default font
+        if len(cls.signs) == 0:
+            cls.signs = {k: pygame.image.load(f) for k, f in cls.sign_files.items()}
+
+    @classmethod
+    def _render_text(cls, text, color, rotate) -> pygame.Surface:
+        assert cls.lane_font is not None
+        return pygame.transform.rotate(cls.lane_font.render(text, True, color), rotate)
+
     def draw_text(self, text, x, y, rotate, color=COLORS["WHITE"], h_center=False, v_center=False):
-        text_surface = self.lane_font.render(text, True, color)
-        rotated_text_surface = pygame.transform.rotate(text_surface, rotate)
+        rotated_text_surface = self.text_sprites.get(
+            (text, color, rotate), lambda: self._render_text(text, color, rotate))
         if h_center:
             x = x - rotated_text_surface.get_width() // 2
         if v_center:
             y = y - rotated_text_surface.get_height() // 2
-        self.surface.blit(rotated_text_surface, (x, y))
+        self.drawn_rects.append(self.surface.blit(rotated_text_surface, (x, y)))
 
     def _draw_lane_label(self, to_direction, x, y, rotate, color=COLORS["WHITE"]):
-        text_surface = self.signs[to_direction]
+        rotated_text_surface = self.sign_sprites.get(
+            (to_direction, rotate), lambda: pygame.transform.rotate(self.signs[to_direction], rotate))
         # self.screen.blit(self.signs["left"], (x, y))
-        rotated_text_surface = pygame.transform.rotate(text_surface, rotate)
         # if rotate == 0:
         #     x = x - rotated_text_surface.get_width()
         # elif rotate == 270:
         #     y = y - rotated_text_surface.get_height()
         self.surface.blit(rotated_text_surface, (x, y))
 
+    @staticmethod
+    def _render_car(width, length, color, rotate) -> pygame.Surface:
+        car_surface = pygame.Surface((width, length), pygame.SRCALPHA)
+        pygame.draw.rect(car_surface, color, car_surface.get_rect())
+        return pygame.transform.rotate(car_surface, rotate)
+
     def _draw_car(self, car: Car):
-        car_surface = pygame.Surface((car.width, car.length), pygame.SRCALPHA)
-        pygame.draw.rect(car_surface, car.color, car_surface.get_rect())
-        rotated_car_surface = pygame.transform.rotate(car_surface, car.rotate)
+        """
+        Queue the car for #_blit_cars()
+        """
+        key = (car.width, car.length, car.color, car.rotate)
+        rotated_car_surface = self.car_sprites.get(key, lambda: self._render_car(*key))
         rotated_rect = rotated_car_surface.get_rect(center=(car.x, car.y))
 
         # Blit the rotated car surface onto the screen at the position of the rotated rect
-        self.surface.blit(rotated_car_surface, rotated_rect.center)
+        self.car_blits.append((rotated_car_surface, rotated_rect.center))
+
+    def _blit_cars(self):
+        self.drawn_rects.extend(self.surface.blits(self.car_blits))  # type: ignore
+        self.car_blits = []
 
     def _draw_cars_on_lane(self, lane: Lane, x, y, width, length, approach_direction):
         for car in lane.cars:
@@ -103,90 +154,83 @@ class Environment:
                 car.set_geo(car_x, car_y, 90)
             self._draw_car(car)
 
-    def _draw_lane(self, lane: Lane, x, y, width, length, approach_direction):
+    def _draw_lane(self, lane: Lane, x, y, width, length, approach_direction, static=True):
+        """
+        Must choose the right origin for x, y
+        static: draw the lines and label of the lane, otherwise its light
+        """
         label_offset = width // 2 - 8
-        """Must choose the right origin for x, y"""
         if approach_direction == "north":
             # origin is top left
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
-                             (x, y), (x, y + length))
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x + width, y),
-                             (x + width, y + length))
-            lane.set_geo(int(x), int(y), int(x+width), int(y), width, length)
-            if lane.is_approach:
-                self._draw_lane_label(lane.to_direction, x + label_offset, y +
-                                      10, 0, self.COLORS["ROAD_ACCENT"])
-            # self._draw_sign(approach_direction, lane.to_direction, x, y)
-            # Draw traffic light
-            if lane.is_approach and lane.light:
+            if static:
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
+                                 (x, y), (x, y + length))
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x + width, y),
+                                 (x + width, y + length))
+                if lane.is_approach:
+                    self._draw_lane_label(lane.to_direction, x + label_offset, y +
+                                          10, 0, self.COLORS["ROAD_ACCENT"])
+            elif lane.is_approach and lane.light:
                 lit_color = self.COLORS[lane.light.color.upper()]
-                pygame.draw.rect(self.surface, lit_color, (x, y-5, width, 5))
+                self.drawn_rects.append(pygame.draw.rect(self.surface, lit_color, (x, y-5, width, 5)))
 
             return (x + width, y)
         elif approach_direction == "south":
             # origin is bottom right
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
-                             (x, y), (x, y - length))
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x - width, y),
-                             (x - width, y - length))
-            lane.set_geo(int(x), int(y), int(x-width), int(y), width, length)
-            if lane.is_approach:
-                self._draw_lane_label(lane.to_direction, x - width + label_offset,
-                                      y - 45, 180, self.COLORS["ROAD_ACCENT"])
-            # self._draw_sign(approach_direction, lane.to_direction, x, y)
-            # Draw traffic light
-            if lane.is_approach and lane.light:
+            if static:
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
+                                 (x, y), (x, y - length))
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x - width, y),
+                                 (x - width, y - length))
+                if lane.is_approach:
+                    self._draw_lane_label(lane.to_direction, x - width + label_offset,
+                                          y - 45, 180, self.COLORS["ROAD_ACCENT"])
+            elif lane.is_approach and lane.light:
                 lit_color = self.COLORS[lane.light.color.upper()]
-                pygame.draw.rect(self.surface, lit_color,
-                                 (x-width+1, y, width, 5))
+                self.drawn_rects.append(pygame.draw.rect(self.surface, lit_color,
+                                                         (x-width+1, y, width, 5)))
 
             return (x - width, y)
         elif approach_direction == "east":
             # origin is top right
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
-                             (x, y), (x-length, y))
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x, y+width),
-                             (x-length, y+width))
-            lane.set_geo(int(x), int(y), int(x), int(y+width), width, length)
-            if lane.is_approach:
-                self._draw_lane_label(lane.to_direction, x - 45, y +
-                                      label_offset, 270, self.COLORS["ROAD_ACCENT"])
-            # self._draw_sign(approach_direction, lane.to_direction, x, y)
-            # Draw traffic light
-            if lane.is_approach and lane.light:
+            if static:
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
+                                 (x, y), (x-length, y))
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x, y+width),
+                                 (x-length, y+width))
+                if lane.is_approach:
+                    self._draw_lane_label(lane.to_direction, x - 45, y +
+                                          label_offset, 270, self.COLORS["ROAD_ACCENT"])
+            elif lane.is_approach and lane.light:
                 lit_color = self.COLORS[lane.light.color.upper()]
-                pygame.draw.rect(self.surface, lit_color, (x, y+1, 5, width))
+                self.drawn_rects.append(pygame.draw.rect(self.surface, lit_color, (x, y+1, 5, width)))
 
             return (x, y+width)
         elif approach_direction == "west":
             # origin is bottom left
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
-                             (x, y), (x+length, y))
-            pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x, y-width),
-                             (x + length, y - width))
-            lane.set_geo(int(x), int(y), int(x), int(y-width), width, length)
-            if lane.is_approach:
-                self._draw_lane_label(lane.to_direction, x + 10, y - width +
-                                      label_offset, 90, self.COLORS["ROAD_ACCENT"])
-            # self._draw_sign(approach_direction, lane.to_direction, x, y)
-            # Draw traffic light
-            if lane.is_approach and lane.light:
+            if static:
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"],
+                                 (x, y), (x+length, y))
+                pygame.draw.line(self.surface, self.COLORS["LANE_LINE"], (x, y-width),
+                                 (x + length, y - width))
+                if lane.is_approach:
+                    self._draw_lane_label(lane.to_direction, x + 10, y - width +
+                                          label_offset, 90, self.COLORS["ROAD_ACCENT"])
+            elif lane.is_approach and lane.light:
                 lit_color = self.COLORS[lane.light.color.upper()]
-                pygame.draw.rect(self.surface, lit_color,
-                                 (x-5, y-width, 5, width))
+                self.drawn_rects.append(pygame.draw.rect(self.surface, lit_color,
+                                                         (x-5, y-width, 5, width)))
 
             return (x, y-width)
         return (x, y)
 
-    def _draw_lanes(self, st: Street):
+    def _draw_lanes(self, st: Street, static=True):
         """
-        draw approach and exit lanes with 2 lines for each lane
+        draw approach and exit lanes with 2 lines for each lane and the divider,
+        or when not static the lights and the cars of the lanes
         """
         # Calculate the width of each lane based on the road width and the number of lanes
-        approach_lane_width = (
-            st.width - st.divider_width) * Environment.approach_width_ratio / len(st.approach_lanes)
-        exit_lane_width = (st.width - st.divider_width) * \
-            (1 - Environment.approach_width_ratio) / len(st.exit_lanes)
+        approach_lane_width, exit_lane_width = lane_widths(st)
 
         start_x, start_y = st.x, st.y  # initialize origin
 
@@ -194,8 +238,8 @@ class Environment:
             for lane in lanes:
                 old_x, old_y = start_x, start_y
                 start_x, start_y = self._draw_lane(
-                    lane, start_x, start_y, width, st.length, st.approach_direction)
-                if len(lane.cars) > 0:
+                    lane, start_x, start_y, width, st.length, st.approach_direction, static)
+                if not static and len(lane.cars) > 0:
                     self._draw_cars_on_lane(lane, old_x, old_y, width, st.length,
                                             st.approach_direction)
             return start_x, start_y
@@ -208,8 +252,9 @@ class Environment:
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, approach_lane_width, st.approach_lanes)
             # draw divider
-            pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x + 1, start_y,
-                             st.divider_width - 1, st.length))
+            if static:
+                pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x + 1, start_y,
+                                 st.divider_width - 1, st.length))
             start_x += st.divider_width
             # draw exit lanes
             start_x, start_y = _draw_lanes_inner(
@@ -223,8 +268,9 @@ class Environment:
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, approach_lane_width, st.approach_lanes)
             # draw divider
-            pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x -
-                             st.divider_width, start_y - st.length, st.divider_width, st.length))
+            if static:
+                pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x -
+                                 st.divider_width, start_y - st.length, st.divider_width, st.length))
             start_x -= st.divider_width
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, exit_lane_width, st.exit_lanes)
@@ -237,8 +283,9 @@ class Environment:
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, approach_lane_width, st.approach_lanes)
             # draw divider
-            pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x - st.length, start_y + 1,
-                                                                    st.length, st.divider_width - 1))
+            if static:
+                pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x - st.length, start_y + 1,
+                                                                        st.length, st.divider_width - 1))
             start_y += st.divider_width
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, exit_lane_width, st.exit_lanes)
@@ -251,21 +298,25 @@ class Environment:
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, approach_lane_width, st.approach_lanes)
             # draw divider
-            pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x, start_y - st.divider_width + 1,
-                                                                    st.length, st.divider_width - 1))
+            if static:
+                pygame.draw.rect(self.surface, self.COLORS["DIVIDER"], (start_x, start_y - st.divider_width + 1,
+                                                                        st.length, st.divider_width - 1))
             start_y -= st.divider_width
             start_x, start_y = _draw_lanes_inner(
                 start_x, start_y, exit_lane_width, st.exit_lanes)
 
-    def _draw_streets(self):
+    def _draw_streets(self, static=True):
         for st in self.roads_config:
+            if not static:
+                self._draw_lanes(st, static)
+                continue
             if st.approach_direction in ["north", "south"]:
                 pygame.draw.rect(
                     self.surface, self.COLORS["ROAD"], (st.x, st.y, st.width, st.length))
             else:
                 pygame.draw.rect(
                     self.surface, self.COLORS["ROAD"], (st.x, st.y, st.length, st.width))
-            self._draw_lanes(st)
+            self._draw_lanes(st, static)
 
     def point_at_percentage(self, ax: int, ay: int, bx: int, by: int, t: float):
         return (ax + t * (bx - ax), ay + t * (by - ay))
@@ -283,10 +334,8 @@ class Environment:
                         # pygame.draw.line(self.screen, self.COLORS["BACKGROUND_ACCENT"], (
                         #     lane.right_x, lane.right_y), (to_lane.left_x, to_lane.left_y))
                     elif lane.to_direction == 'through':
-                        pygame.draw.line(self.surface, self.COLORS["WHITE"], (
-                            lane.right_x, lane.right_y), (to_lane.left_x, to_lane.left_y))
-                        lane.to_intsec.set_length(int(math.sqrt(
-                            (lane.right_x - to_lane.left_x)**2 + (lane.right_y - to_lane.left_y)**2)))
+                        self.drawn_rects.append(pygame.draw.line(self.surface, self.COLORS["WHITE"], (
+                            lane.right_x, lane.right_y), (to_lane.left_x, to_lane.left_y)))
                         for car in lane.to_intsec.cars:
                             car_per = car.travel_distance / lane.to_intsec.length
                             x, y = self.point_at_percentage(
@@ -315,12 +364,10 @@ class Environment:
                             self._draw_car(car)
                     elif lane.to_direction == 'right':
                         x, y = lane.right_x, to_lane.left_y
-                        pygame.draw.line(self.surface, self.COLORS["WHITE"], (
-                            lane.right_x, lane.right_y), (to_lane.left_x, to_lane.left_y))
+                        self.drawn_rects.append(pygame.draw.line(self.surface, self.COLORS["WHITE"], (
+                            lane.right_x, lane.right_y), (to_lane.left_x, to_lane.left_y)))
 
-                        length = int(math.sqrt(
-                            (lane.right_x - to_lane.left_x)**2 + (lane.right_y - to_lane.left_y)**2))
-                        lane.to_intsec.set_length(length)
+                        length = lane.to_intsec.length
                         for car in lane.to_intsec.cars:
                             car_pre = car.travel_distance / length
                             x, y = self.point_at_percentage(
@@ -351,8 +398,8 @@ class Environment:
 
     def _draw_timer(self):
         # draw elapsed time
-        clock_ms = clock().get_ticks()
-        self.draw_text(f"World time: {clock_ms//1000}s", 10, 8, 0, self.COLORS["WHITE"])  # noqa
+        clock_ms = self.clock.get_ticks()
+        self.draw_text(f"World time: {int(clock_ms//1000)}s", 10, 8, 0, self.COLORS["WHITE"])  # noqa
 
     def draw_countdown(self, count: str):
         # width, height = self.surface.get_width(), self.surface.get_height()
@@ -363,14 +410,50 @@ class Environment:
         dialog_h = 100
 
         dialog_y = (height // 2) - (dialog_h // 2)
-        print("Draw dialog", text, clock().get_ticks()//1000)
-        pygame.draw.rect(
-            self.surface, self.COLORS["WHITE"], (0, dialog_y, width, dialog_h))
+        logger.info("Draw dialog %s at %ds", text, self.clock.get_ticks()//1000, every_s=10)
+        self.drawn_rects.append(pygame.draw.rect(
+            self.surface, self.COLORS["WHITE"], (0, dialog_y, width, dialog_h)))
         self.draw_text(text, width // 2, dialog_y + dialog_h //
                        2, 0, self.COLORS["BLACK"], h_center=True, v_center=True)
 
-    def next_tick(self):
+    def _render_background(self) -> pygame.Surface:
+        """
+        Draw the static road layout once: background, roads, lane lines, dividers and lane signs
+        """
         self.surface.fill(self.COLORS["BACKGROUND"])
-        self._draw_streets()
+        self._draw_streets(static=True)
+        return self.surface.copy()
+
+    def invalidate_background(self):
+        """
+        Redraw the static layer next frame, e.g. after the layout of the streets changed
+        """
+        self.background = None
+
+    def next_tick(self):
+        last_rects = self.drawn_rects
+        self.drawn_rects = []
+        if self.background is None:
+            self.background = self._render_background()
+            last_rects = [self.surface.get_rect()]
+        elif self.use_dirty_rects:
+            # restore only what the last frame drew over
+            for rect in last_rects:
+                self.surface.blit(self.background, rect, rect)
+        else:
+            self.surface.blit(self.background, (0, 0))
+            last_rects = [self.surface.get_rect()]
+
+        self.restored_rects = last_rects
+
+        self._draw_streets(static=False)
         self._draw_intersections()
+        self._blit_cars()
         self._draw_timer()
+
+    @property
+    def dirty_rects(self) -> list[pygame.Rect]:
+        """
+        Areas changed this frame, including text drawn after #next_tick(), e.g. a countdown
+        """
+        return self.restored_rects + self.drawn_rects
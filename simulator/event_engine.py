@@ -0,0 +1,352 @@
+import heapq
+from typing import Optional
+
+from simulator import timer
+from simulator.car import Car
+from simulator.street import CarQueue, Lane, Street
+from simulator.traffic import Traffic
+
+# what a car is doing, see EventTraffic
+MOVING = 0
+BLOCKED = 1  # too close to its front car, counts as stopped and waits
+HELD = 2  # at the stop line of a yellow or red light
+DELAY = 3  # held, the light turned green, starts after Car.start_delay_ms
+
+# the next event of a car
+ARRIVE, LINE, END, CATCH, UNBLOCK, START = range(6)
+
+stop_line_offset = 8
+# px, closer than this counts as reached, so float noise does not bounce between events
+epsilon = 1e-6
+
+
+class CarState:
+    """
+    Motion of a car since its last event: at travel_distance at `since_ms`, moving at init_speed or not
+    """
+    __slots__ = ["status", "since_ms", "version", "blocked_ms", "delay_end_ms"]
+
+    def __init__(self, since_ms: float):
+        self.status = MOVING
+        self.since_ms = since_ms
+        # bumped on every replan, older events of the car are stale
+        self.version = 0
+        self.blocked_ms = 0.0
+        self.delay_end_ms = 0.0
+
+
+class EventTraffic(Traffic):
+    """
+    Traffic advanced by events instead of ticks. Cars drive at constant speed between events,
+    the next event of every car (reaching the stop line, catching up with a stopped front car,
+    the gap to the front car opening, the start delay ending, leaving a lane or an intersection)
+    and the next arrival are kept in a priority queue. Idle cars cost nothing: a queue at a red
+    light is only touched when the light changes.
+
+    Same driving rules, KPIs and TripStats as Traffic, time advances in one jump to the clock:
+    call #next_tick() whenever the clock moved, or drive it with EventSimulation. Light changes
+    are picked up at the next call. Car.travel_distance is only updated at the events of the car,
+    call #update_positions() before rendering.
+    """
+
+    def __init__(self, time_scale: int, streets: list[Street], cars_config, game_config, keep_cars=False, debug_kpis=False, clock: Optional[timer.WorldClock] = None) -> None:  # noqa
+        super().__init__(time_scale, streets, cars_config, game_config, keep_cars=keep_cars,
+                         debug_kpis=debug_kpis, clock=clock)
+        self.light_lanes = [lane for st in streets for lane in st.approach_lanes if lane.light is not None]
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None):
+        super().reset(seed)
+        now = self.clock.get_ticks()
+        self.states: dict[Car, CarState] = {}
+        self.events: list[tuple[float, int, Optional[Car], int, int]] = []
+        self.num_pushed = 0
+        self.pending: list[Car] = []
+        # blocked cars of every lane queue: [count, sum of blocked_ms], for the waiting time KPI
+        self.blocked: dict[CarQueue, list[float]] = {}
+        self.light_colors = {lane: lane.light.color for lane in self.light_lanes}  # type: ignore
+        self.now_ms = now
+        self._schedule_arrival(now)
+
+    def get_snapshot(self) -> tuple:
+        """
+        Traffic#get_snapshot() plus the pending events and the motion of every car
+        """
+        states = tuple((car, st.status, st.since_ms, st.version, st.blocked_ms, st.delay_end_ms)
+                       for car, st in self.states.items())
+        blocked = tuple((queue, count[0], count[1]) for queue, count in self.blocked.items())
+        return (super().get_snapshot(), states, list(self.events), self.num_pushed, blocked,
+                dict(self.light_colors), self.now_ms)
+
+    def set_snapshot(self, state: tuple):
+        traffic_state, states, events, self.num_pushed, blocked, light_colors, self.now_ms = state
+        super().set_snapshot(traffic_state)
+        self.states = {}
+        for car, status, since_ms, version, blocked_ms, delay_end_ms in states:
+            car_state = CarState(since_ms)
+            car_state.status, car_state.version = status, version
+            car_state.blocked_ms, car_state.delay_end_ms = blocked_ms, delay_end_ms
+            self.states[car] = car_state
+        # a heap stays a heap when copied
+        self.events = list(events)
+        self.blocked = {queue: [count, blocked_ms] for queue, count, blocked_ms in blocked}
+        self.light_colors = dict(light_colors)
+        self.pending = []
+
+    def _push(self, at_ms: float, car: Optional[Car], kind: int):
+        version = self.states[car].version if car is not None else 0
+        heapq.heappush(self.events, (at_ms, self.num_pushed, car, version, kind))
+        self.num_pushed += 1
+
+    def _schedule_arrival(self, after_ms: float):
+        cars_per_min = self.cars_config["cars_per_min"]
+        if cars_per_min > 0:
+            self._push(after_ms + 60_000 / cars_per_min, None, ARRIVE)
+
+    def next_event_ms(self) -> float:
+        """
+        Simulated time of the next event, a simulation can jump straight to it
+        """
+        while self.events and self._is_stale(self.events[0]):
+            heapq.heappop(self.events)
+        return self.events[0][0] if self.events else float("inf")
+
+    def _is_stale(self, event) -> bool:
+        car, version = event[2], event[3]
+        return car is not None and (car not in self.states or version != self.states[car].version)
+
+    def _run_events(self, until_ms: float, inclusive=True):
+        while self.events and (self.events[0][0] <= until_ms if inclusive else self.events[0][0] < until_ms):
+            event = heapq.heappop(self.events)
+            if self._is_stale(event):
+                continue
+            at_ms, _, car, _, kind = event
+            if car is None:
+                self._arrive(at_ms)
+            else:
+                self._handle(car, kind, at_ms)
+            self._replan_pending(at_ms)
+
+    def next_tick(self):
+        clock_ms = self.clock.get_ticks()
+        # the lights changed at some point up to now, seen as changed now
+        self._run_events(clock_ms, inclusive=False)
+        self._sync_lights(clock_ms)
+        self._run_events(clock_ms)
+        self.now_ms = clock_ms
+        self._sync_waiting(clock_ms)
+        if self.debug_kpis:
+            self.check_kpis()
+        return clock_ms
+
+    # --- motion
+
+    def _travel(self, car: Car, at_ms: float) -> float:
+        state = self.states[car]
+        if state.status != MOVING:
+            return car.travel_distance
+        return car.travel_distance + car.init_speed * (at_ms - state.since_ms) / 1000
+
+    def _move_to(self, car: Car, at_ms: float):
+        car.travel_distance = self._travel(car, at_ms)
+        self.states[car].since_ms = at_ms
+
+    def update_positions(self):
+        """
+        Move every driving car to the current time, e.g. before rendering
+        """
+        for car in self.all_cars:
+            self._move_to(car, self.now_ms)
+
+    def _touch(self, car: Optional[Car]):
+        if car is not None and car in self.states:
+            self.pending.append(car)
+
+    def _replan_pending(self, at_ms: float):
+        while self.pending:
+            self._plan(self.pending.pop(), at_ms)
+
+    def _set_status(self, car: Car, status: int, at_ms: float):
+        """
+        Change what a car does, its follower has to replan
+        """
+        state = self.states[car]
+        self._move_to(car, at_ms)
+        if state.status == BLOCKED:
+            count = self.blocked[car.queue]  # type: ignore
+            count[0] -= 1
+            count[1] -= state.blocked_ms
+            car.updated_waiting_ms = 0
+        if status == BLOCKED:
+            if car.current_speed >= 1:
+                car.stops += 1
+            car._set_speed(0)
+            state.blocked_ms = at_ms
+            count = self.blocked.setdefault(car.queue, [0, 0.0])  # type: ignore
+            count[0] += 1
+            count[1] += at_ms
+        elif status == MOVING:
+            car._set_speed(car.init_speed)
+        elif status == HELD and state.status in [MOVING, DELAY] and car.current_speed >= 1:
+            car.stops += 1
+        state.status = status
+        self._touch(car)
+        self._touch(car.follower)
+
+    def _plan(self, car: Car, at_ms: float):
+        """
+        Schedule the next event of a car from its status and its front car
+        """
+        state = self.states[car]
+        state.version += 1
+        if state.status == HELD:
+            return
+        if state.status == DELAY:
+            self._push(state.delay_end_ms, car, START)
+            return
+        speed_ms = car.init_speed / 1000
+        x = self._travel(car, at_ms)
+        leader = None if car.in_intersection else car.leader
+        gap = None
+        leader_moving = False
+        if leader is not None:
+            gap = self._travel(leader, at_ms) - leader.length - x - car.drive_config["front"]
+            leader_moving = self.states[leader].status == MOVING
+        if state.status == BLOCKED:
+            if gap is None or (leader_moving and gap >= -epsilon):
+                self._set_status(car, MOVING, at_ms)
+            elif leader_moving:
+                self._push(at_ms - gap / speed_ms, car, UNBLOCK)
+            return
+
+        if car.in_intersection:
+            self._push(at_ms + max(0, car.to_intsec.length - car.length - x) / speed_ms, car, END)
+            return
+        lane: Lane = car.lane
+        length = car.street.length
+        stop_line = length - stop_line_offset
+        has_light = lane.is_approach and lane.light is not None
+        if has_light and x >= stop_line and lane.light.color != "green":  # type: ignore
+            self._set_status(car, HELD, at_ms)
+            return
+        if gap is not None and (gap < -epsilon or (not leader_moving and gap <= epsilon)):
+            self._set_status(car, BLOCKED, at_ms)
+            return
+        next_ms, kind = at_ms + max(0, length + car.length - x) / speed_ms, END
+        if has_light and x < stop_line and at_ms + (stop_line - x) / speed_ms < next_ms:
+            next_ms, kind = at_ms + (stop_line - x) / speed_ms, LINE
+        if gap is not None and not leader_moving and at_ms + gap / speed_ms < next_ms:
+            next_ms, kind = at_ms + gap / speed_ms, CATCH
+        self._push(next_ms, car, kind)
+
+    # --- events
+
+    def _arrive(self, at_ms: float):
+        self._spawn_car()
+        car = next(reversed(self.all_cars))
+        car.spawned_ms = at_ms
+        self.last_spawn_ms = at_ms
+        self.states[car] = CarState(at_ms)
+        self._touch(car)
+        self._schedule_arrival(at_ms)
+
+    def _handle(self, car: Car, kind: int, at_ms: float):
+        if kind == LINE:
+            self._move_to(car, at_ms)
+            car.travel_distance = car.street.length - stop_line_offset
+            self._touch(car)
+        elif kind == CATCH:
+            self._set_status(car, BLOCKED, at_ms)
+        elif kind in [UNBLOCK, START]:
+            self._set_status(car, MOVING, at_ms)
+        elif kind == END:
+            self._move_to(car, at_ms)
+            self._touch(car.follower)
+            if car.in_intersection:
+                self._leave_intersection(car)
+            elif car.to_street is None:
+                car.lane.remove_car(car)
+                del self.states[car]
+                self.finish_car(car, at_ms)
+                return
+            else:
+                car.lane.remove_car(car)
+                car.in_intersection = True
+                car.to_intsec.add_car(car)
+                car.street = None
+            car.reset_travel_distance()
+            self._touch(car)
+
+    def _leave_intersection(self, car: Car):
+        car.in_intersection = False
+        car.to_intsec.remove_car(car)
+        car.street = car.to_street
+        car.to_street = None  # leaves the simulation
+        car.lane = car.to_intsec.to_lane
+        car.lane.add_car(car)
+
+    def _sync_lights(self, at_ms: float):
+        """
+        Stop or start the cars of the lanes whose light changed since the last tick
+        """
+        for lane in self.light_lanes:
+            color = lane.light.color  # type: ignore
+            if color == self.light_colors[lane]:
+                continue
+            self.light_colors[lane] = color
+            for car in lane.cars:
+                state = self.states[car]
+                if color == "green" and state.status == HELD:
+                    state.delay_end_ms = at_ms + Car.start_delay_ms
+                    self._set_status(car, DELAY, at_ms)
+                elif color != "green" and state.status == DELAY:
+                    self._set_status(car, HELD, at_ms)
+                elif state.status == MOVING:
+                    self._touch(car)
+        self._replan_pending(at_ms)
+
+    # --- KPIs
+
+    def _sync_waiting(self, clock_ms: float):
+        """
+        Waiting time of the blocked cars up to now, in the running KPIs of their lanes
+        """
+        for queue, (count, blocked_ms) in self.blocked.items():
+            queue.total_waiting_ms = count * clock_ms - blocked_ms if count > 0 else 0.0
+
+    def check_kpis(self):
+        for car, state in self.states.items():
+            if state.status == BLOCKED:
+                car.updated_waiting_ms = self.now_ms - state.blocked_ms
+        super().check_kpis()
+
+
+class EventSimulation:
+    """
+    Runs EventTraffic and its lights by jumping a VirtualClock from event to event,
+    nothing is computed between events
+    """
+
+    def __init__(self, traffic: EventTraffic, lights_control, clock: timer.VirtualClock):
+        """
+        lights_control: AdaptiveLightsControl or StaticLightsControl, anything with next_tick() and next_change_ms()
+        """
+        self.traffic = traffic
+        self.lights_control = lights_control
+        self.clock = clock
+        self.num_events = 0
+
+    def run_until(self, until_ms: float):
+        """
+        Simulate up to `until_ms`, e.g. the next decision of an agent
+        """
+        self.lights_control.next_tick()
+        self.traffic.next_tick()
+        while self.clock.get_ticks() < until_ms:
+            next_change_ms = self.lights_control.next_change_ms()
+            next_ms = min(self.traffic.next_event_ms(), until_ms,
+                          next_change_ms if next_change_ms is not None else until_ms)
+            self.clock.jump_to(next_ms)
+            self.lights_control.next_tick()
+            self.traffic.next_tick()
+            self.num_events += 1
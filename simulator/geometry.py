@@ -0,0 +1,97 @@
+import math
+from simulator.street import Lane, Street
+
+# share of the street width (minus the divider) taken by the approach lanes
+approach_width_ratio = 0.6
+
+
+def lane_widths(st: Street):
+    """
+    Return the width of each approach lane and each exit lane of the street
+    """
+    approach_lane_width = (
+        st.width - st.divider_width) * approach_width_ratio / len(st.approach_lanes)
+    exit_lane_width = (st.width - st.divider_width) * \
+        (1 - approach_width_ratio) / len(st.exit_lanes)
+    return approach_lane_width, exit_lane_width
+
+
+def _layout_lane(lane: Lane, x, y, width, length, approach_direction):
+    """
+    Set the lane geometry from its origin, return the origin of the next lane
+    """
+    if approach_direction == "north":
+        # origin is top left
+        lane.set_geo(int(x), int(y), int(x+width), int(y), width, length)
+        return (x + width, y)
+    elif approach_direction == "south":
+        # origin is bottom right
+        lane.set_geo(int(x), int(y), int(x-width), int(y), width, length)
+        return (x - width, y)
+    elif approach_direction == "east":
+        # origin is top right
+        lane.set_geo(int(x), int(y), int(x), int(y+width), width, length)
+        return (x, y+width)
+    elif approach_direction == "west":
+        # origin is bottom left
+        lane.set_geo(int(x), int(y), int(x), int(y-width), width, length)
+        return (x, y-width)
+    return (x, y)
+
+
+def layout_lanes(st: Street):
+    """
+    Compute geometry of approach and exit lanes, walking the lanes the same way Environment draws them
+    """
+    approach_lane_width, exit_lane_width = lane_widths(st)
+
+    def _layout_lanes_inner(start_x, start_y, width, lanes: list[Lane]):
+        for lane in lanes:
+            start_x, start_y = _layout_lane(
+                lane, start_x, start_y, width, st.length, st.approach_direction)
+        return start_x, start_y
+
+    if st.approach_direction == "north":
+        start_x, start_y = _layout_lanes_inner(
+            st.x, st.y, approach_lane_width, st.approach_lanes)
+        start_x += st.divider_width
+    elif st.approach_direction == "south":
+        start_x, start_y = _layout_lanes_inner(
+            st.x + st.width, st.y + st.length, approach_lane_width, st.approach_lanes)
+        start_x -= st.divider_width
+    elif st.approach_direction == "east":
+        start_x, start_y = _layout_lanes_inner(
+            st.x + st.length, st.y, approach_lane_width, st.approach_lanes)
+        start_y += st.divider_width
+    elif st.approach_direction == "west":
+        start_x, start_y = _layout_lanes_inner(
+            st.x, st.y + st.width, approach_lane_width, st.approach_lanes)
+        start_y -= st.divider_width
+    else:
+        return
+    _layout_lanes_inner(start_x, start_y, exit_lane_width, st.exit_lanes)
+
+
+def layout_intersections(streets: list[Street]):
+    """
+    Set the length of each intersection path from the geometry of the lanes it connects.
+    Left turns are short enough to keep the default length.
+    """
+    for st in streets:
+        for lane in st.approach_lanes:
+            if lane.to_intsec is None or lane.to_intsec.to_lane is None:
+                continue
+            if lane.to_direction not in ['through', 'right']:
+                continue
+            to_lane = lane.to_intsec.to_lane
+            lane.to_intsec.set_length(int(math.sqrt(
+                (lane.right_x - to_lane.left_x)**2 + (lane.right_y - to_lane.left_y)**2)))
+
+
+def layout(streets: list[Street]):
+    """
+    Compute lane and intersection geometry once, no rendering needed
+    """
+    for st in streets:
+        layout_lanes(st)
+    layout_intersections(streets)
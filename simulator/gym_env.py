@@ -1,15 +1,56 @@
 import os
+import random
 from typing import Any, Optional
 from gymnasium import Env, spaces
 import numpy as np
 import pygame
 from pygame.time import Clock
 
+from simulator import log
+from simulator.car_engine import CarEngine
 from simulator.environment import Environment
+from simulator.event_engine import EventTraffic
 from simulator.lights_control.adaptive import AdaptiveLightsControl, Phase
-from simulator.lights_control.light import lit_north_left, lit_north_through, lit_north_right, lit_south_left, lit_south_through, lit_south_right, lit_west_left, lit_west_through, lit_west_right, lit_east_left, lit_east_through, lit_east_right
-from simulator.config import streets, cars_config, game_config
+from simulator.config import cars_config, game_config
+from simulator.lights_control.light import Light
+from simulator.raster import Rasterizer
+from simulator.render_thread import AsyncRenderer
+from simulator.street import Street
+from simulator.timer import VirtualClock, WorldClock, new_clock
 from simulator.traffic import Traffic
+from simulator.warm_start import WarmStartPool, load_state
+from simulator.world import create_world
+
+logger = log.get_logger("env")
+
+
+def create_phases(lights: dict[str, Light]) -> list[Phase]:
+    """
+    The phases the agent switches between, for the lights of one world
+    """
+    return [
+        Phase([lights["north_right"], lights["south_right"]]),
+        Phase([lights["north_through"], lights["north_left"],
+               lights["south_through"], lights["south_left"]]),
+        Phase([lights["west_right"], lights["east_right"]]),
+        Phase([lights["west_through"], lights["west_left"],
+              lights["east_through"], lights["east_left"]]),
+    ]
+
+
+def lane_obs_key(street: Street, lane) -> str:
+    return f"{street.approach_direction}_{lane.to_direction}_q"
+
+
+def calculate_reward(total_queue_length, total_waiting_ms, cars_since_switch, phase_stay_ms):
+    """
+    Reward for every car passing, penalty for every step the cars waiting.
+    Works on scalars and on NumPy arrays of batched envs alike.
+    """
+    return -total_queue_length + \
+        -(total_waiting_ms / 1000 / 8) + \
+        10 * cars_since_switch + \
+        10 * (phase_stay_ms / 1000)  # reward for staying in the same phase # noqa
 
 
 class TrafficSimulatorEnv(Env):
@@ -35,33 +76,81 @@ class TrafficSimulatorEnv(Env):
         "max_waiting_time": 100  # 100s
     }
 
-    def __init__(self, render_mode=None):
-        super(TrafficSimulatorEnv, self).__init__()
+    engines = ["object", "numpy", "event"]
+    renderers = ["pygame", "numpy"]
 
-        # Force render mode to human.
-        render_mode = "human"
+    def __init__(self, render_mode=None, engine="object", debug_kpis=False, clock: Optional[WorldClock] = None,
+                 render_every=1, render_async=False, renderer="pygame", render_size: Optional[tuple[int, int]] = None,  # noqa
+                 decision_frames=1, decision_s: Optional[float] = None, warm_start: Optional[WarmStartPool] = None):
+        """
+        engine: "object" advances every Car on its own, "numpy" advances all cars in one vectorized update,
+            "event" only computes the cars at their events, see EventTraffic
+        debug_kpis: cross-check the running lane KPIs with a full recomputation every step
+        clock: clock of the simulated world, defaults to a new clock configured like the global one,
+            a VirtualClock without a human render mode or with render_async, see timer.new_clock()
+        render_every: draw only every Nth step
+        render_async: in human mode a render thread draws snapshots of the world at render_fps,
+            the steps run unthrottled instead of waiting for every frame
+        renderer: "numpy" draws rgb_array frames with a Rasterizer, without pygame. The frame array is
+            reused by the next render, copy it to keep it
+        render_size: (width, height) of the numpy frames, the screen size by default
+        decision_frames: frames simulated per step, the agent only observes and acts every N frames
+        decision_s: the decision interval in simulated seconds instead, rounded to whole frames
+        warm_start: pre-simulated states for reset(options={"warm_start": True}), built for the same
+            demand and engine, see WarmStartPool
+        """
+        super(TrafficSimulatorEnv, self).__init__()
 
-        # Initialize your game components here
-        self.lights_phases_config = [
-            Phase([lit_north_right, lit_south_right]),
-            Phase([lit_north_through, lit_north_left,
-                   lit_south_through, lit_south_left]),
-            Phase([lit_west_right, lit_east_right]),
-            Phase([lit_west_through, lit_west_left,
-                  lit_east_through, lit_east_left]),
-        ]
+        # Initialize your game components here, every env owns an independent world
+        if clock is None:
+            # a wall clock reads pygame ticks, only a human render mode on this thread runs pygame.
+            # An async renderer initialises pygame on its own thread and must not throttle the steps
+            clock = new_clock(headless=render_mode != "human" or render_async)
+        self.world = create_world(clock)
+        self.lights_phases_config = create_phases(self.world.lights)
 
         self.render_mode = render_mode
         self.screen: Optional[pygame.Surface] = None
         self.clock: Optional[Clock] = None
         self.environment: Optional[Environment] = None
-        self.lights_control = AdaptiveLightsControl(self.lights_phases_config, self.metadata["traffic_light_timings"])  # noqa
-        self.traffic = Traffic(1, streets, cars_config, game_config)
+        self.render_every = render_every
+        self.decision_frames = decision_frames
+        if decision_s is not None:
+            self.decision_frames = max(1, round(decision_s * 1000 / self._frame_ms()))
+        self.num_frames = 0
+        self.async_renderer: Optional[AsyncRenderer] = None
+        self.lights_control = AdaptiveLightsControl(self.lights_phases_config, self.metadata["traffic_light_timings"], clock=self.world.clock)  # noqa
 
         if render_mode is not None and render_mode not in self.metadata["render_modes"]:
             raise ValueError(f"Invalid render_mode. Expected one of {self.metadata['render_modes']}, got {render_mode}")  # noqa
-
-        # Render 1 frame to initialize necessary state (like lane length)
+        if engine not in self.engines:
+            raise ValueError(f"Invalid engine. Expected one of {self.engines}, got {engine}")  # noqa
+        if renderer not in self.renderers:
+            raise ValueError(f"Invalid renderer. Expected one of {self.renderers}, got {renderer}")  # noqa
+        self.rasterizer: Optional[Rasterizer] = None
+        self.frame: Optional[np.ndarray] = None
+        if render_mode == "rgb_array" and renderer == "numpy":
+            width, height = render_size if render_size is not None else (None, None)
+            self.rasterizer = Rasterizer([self.world.streets], width, height)
+
+        self.engine = engine
+        car_engine = CarEngine() if engine == "numpy" else None
+        if engine == "event":
+            self.traffic: Traffic = EventTraffic(1, self.world.streets, cars_config, game_config,
+                                                 debug_kpis=debug_kpis, clock=self.world.clock)
+        else:
+            self.traffic = Traffic(1, self.world.streets, cars_config, game_config, car_engine=car_engine,
+                                   debug_kpis=debug_kpis, clock=self.world.clock)
+
+        self.warm_start = warm_start
+        self.warm_start_rng = random.Random()
+        if warm_start is not None:
+            warm_start.check(self)
+
+        # Render 1 frame to open the window
+        if render_mode == "human" and render_async:
+            self.async_renderer = AsyncRenderer(self.world, self.metadata["render_width"],
+                                                self.metadata["render_height"], self.metadata["render_fps"])
         if render_mode == "human":
             self._render_frame()
 
@@ -74,6 +163,15 @@ class TrafficSimulatorEnv(Env):
         })
         self.action_space = spaces.Discrete(start=0, n=4)  # phases
 
+    def _frame_ms(self) -> float:
+        """
+        Simulated time of one frame: the fixed step of a VirtualClock, or a render frame at wall speed
+        """
+        clock = self.world.clock
+        if isinstance(clock, VirtualClock):
+            return clock.dt_ms * clock.speed
+        return 1000 / self.metadata["render_fps"] * clock.speed
+
     def _define_lanes_space(self):
         """
         We define 2 state spaces for each lane!
@@ -81,9 +179,9 @@ class TrafficSimulatorEnv(Env):
         2. number of cars in the lane
         """
         lanes_space = {}
-        for s in streets:
+        for s in self.world.streets:
             for al in s.approach_lanes:
-                lanes_space[f"{s.approach_direction}_{al.to_direction}_q"] = spaces.Discrete(start=0, n=al.get_state_space())  # noqa
+                lanes_space[lane_obs_key(s, al)] = spaces.Discrete(start=0, n=al.get_state_space())  # noqa
                 # lanes_space[f"{s.approach_direction}_{al.to_direction}_aw"] = spaces.Discrete(start=0, n=self.metadata["traffic_light_timings"]["phase_max_s"])  # noqa
 
         return spaces.Dict(lanes_space)
@@ -92,6 +190,13 @@ class TrafficSimulatorEnv(Env):
         """
         Private method to render the current frame / tick of the environment
         """
+        if self.async_renderer is not None:
+            self.async_renderer.publish()
+            return
+        if self.rasterizer is not None:
+            self.frame = self.rasterizer.render(self.frame, car_engine=self.traffic.car_engine)
+            return self.frame[0]
+
         screen_width = self.metadata["render_width"]
         screen_height = self.metadata["render_height"]
 
@@ -106,18 +211,22 @@ class TrafficSimulatorEnv(Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        if self.environment is None and self.render_mode == "human" and self.screen:
+        if self.environment is None and (self.screen or self.render_mode == "rgb_array"):
+            # rgb_array draws off-screen, no display is needed
             self.canvas = pygame.Surface((screen_width, screen_height))
-            self.environment = Environment(self.canvas, streets)
+            self.environment = Environment(self.canvas, self.world.streets, clock=self.world.clock,
+                                           dirty_rects=self.render_mode == "human")
 
         if self.render_mode == "human" and self.screen and self.clock and self.environment:
             temporal_ms = self.clock.get_rawtime()
             self.environment.draw_text(f"Frame: {temporal_ms}ms", 10, 30, 0)  # noqa
 
-            # The following line copies our drawings from `canvas` to the visible window
-            self.screen.blit(self.canvas, self.canvas.get_rect())
+            # The following line copies the changed parts of `canvas` to the visible window
+            dirty_rects = self.environment.dirty_rects
+            for rect in dirty_rects:
+                self.screen.blit(self.canvas, rect, rect)
             pygame.event.pump()
-            pygame.display.update()
+            pygame.display.update(dirty_rects)
 
             # tick the clock to control the frame rate
             self.clock.tick(self.metadata["render_fps"])
@@ -129,15 +238,16 @@ class TrafficSimulatorEnv(Env):
         Private method to capture the current state space variables
         """
         lanes = {}
-        for s in streets:
+        for s in self.world.streets:
             for al in s.approach_lanes:
                 queue_length = al.get_state()
-                lanes[f"{s.approach_direction}_{al.to_direction}_q"] = queue_length  # noqa
+                lanes[lane_obs_key(s, al)] = queue_length
                 # lanes[f"{s.approach_direction}_{al.to_direction}_aw"] = avg_waiting  # noqa
 
         return {
             "p": self.lights_control.current_phase_i,
-            "ps": int(self.lights_control.get_phase_time()/1000),
+            # the agent may hold a phase longer than phase_max_s, keep it in the observation space
+            "ps": min(int(self.lights_control.get_phase_time()/1000), self.metadata["traffic_light_timings"]["phase_max_s"] - 1),  # noqa
             **lanes
         }
 
@@ -153,14 +263,14 @@ class TrafficSimulatorEnv(Env):
         }
 
     def _check_if_done(self):
-        finished_cars = len(self.traffic.finished_cars)
+        finished_cars = self.traffic.calc_finished_cars()
         all_cars = len(self.traffic.all_cars)
         is_done = finished_cars > 0 and all_cars <= 0  # Termination condition
 
         # TODO: add another time out termination
 
         if not is_done:
-            for s in streets:
+            for s in self.world.streets:
                 for al in s.approach_lanes:
                     if al.get_queue_length() > self.metadata["max_queue_length"]:
                         return True
@@ -180,22 +290,25 @@ class TrafficSimulatorEnv(Env):
         last_cars_passed = self.last_switch_total_cars_passed if 'last_switch_total_cars_passed' in self.__dict__ else 0
         cars_since_switch = total_cars_passed - last_cars_passed
 
-        reward = -total_queue_length + \
-            -(total_waiting_ms / 1000 / 8) + \
-            10 * cars_since_switch + \
-            10 * (phase_stay_ms / 1000)  # reward for staying in the same phase # noqa
+        reward = calculate_reward(total_queue_length, total_waiting_ms, cars_since_switch, phase_stay_ms)
 
-        current_p = self.lights_control.current_phase_i
-        print(f"[env] reward={reward:.3f}, total_queue_length={int(total_queue_length):3d}, total_waiting={total_waiting_ms/1000/8:.0f}, cars_since_switch={int(cars_since_switch):3d}, p{current_p}={int(phase_stay_ms/1000):3d}s")  # noqa
+        logger.debug("reward=%.3f, total_queue_length=%3d, total_waiting=%.0f, cars_since_switch=%3d, p%d=%3ds",
+                     reward, total_queue_length, total_waiting_ms / 1000 / 8, cars_since_switch,
+                     self.lights_control.current_phase_i, phase_stay_ms // 1000)
         return reward, total_cars_passed
 
     def reset(self, seed: int | None = None, options: dict[str, Any] | None = None) -> tuple[dict, dict]:
         """
-        The environment can start at a seeded random(R) time: R lights phase, R traffic
+        The environment can start at a seeded random(R) time: R lights phase, R traffic.
+        options={"warm_start": True} starts from a state of the warm start pool instead of empty streets,
+        the seed picks the state and the traffic from there on.
         """
         self.lights_control.reset(seed=seed)
         self.traffic.reset(seed=seed)
-        self.last_switch_total_cars_passed = 0
+        if options is not None and options.get("warm_start"):
+            self._warm_start(seed)
+        self.last_switch_total_cars_passed = self.traffic.calc_passed_cars()
+        self.num_frames = 0
 
         if self.render_mode == "human":
             self._render_frame()
@@ -203,7 +316,29 @@ class TrafficSimulatorEnv(Env):
 
     def step(self, action):
         """
-        action: next phase
+        action: next phase, repeated for the frames of one decision interval.
+        The reward is the sum of the rewards of the frames, the episode ends at the first terminal frame.
+        """
+        reward = 0.0
+        terminated = False
+        frames = 0
+        while frames < self.decision_frames and not terminated:
+            frame_reward, terminated = self._step_frame(action)
+            reward += frame_reward
+            frames += 1
+
+        # Capture the new state of the environment
+        observation = self._get_obs()
+        # truncated = overtime or undertime
+        truncated = False
+        info = self._get_info()  # Additional info for debugging or complex environments
+        info["frames"] = frames
+
+        return observation, reward, terminated, truncated, info
+
+    def _step_frame(self, action) -> tuple[float, bool]:
+        """
+        Advance the world by one frame, returns the reward of the frame and whether the episode ended
         """
         # phase_stay_s = self.lights_control.get_phase_time() / 1000
         penalty_reward = 0
@@ -218,36 +353,63 @@ class TrafficSimulatorEnv(Env):
         do_switch = action == self.lights_control.current_phase_i
         self.lights_control.to_phase(action)
 
-        # Perform one step of the environment
+        # Perform one step of the environment, a VirtualClock only moves forward here
+        self.world.clock.advance()
         overtime = self.lights_control.next_tick()
         self.traffic.next_tick()
-        if self.environment is not None:
+        self.num_frames += 1
+        draw_frame = self.num_frames % self.render_every == 0
+        if draw_frame and self.render_mode is not None and isinstance(self.traffic, EventTraffic):
+            self.traffic.update_positions()
+        if self.environment is not None and draw_frame:
             self.environment.next_tick()
 
-        # Capture the new state of the environment
-        observation = self._get_obs()
         reward, total_cars_passed = self._calculate_reward()
         terminated = self._check_if_done()
-        # truncated = overtime or undertime
-        truncated = False
-        info = self._get_info()  # Additional info for debugging or complex environments
 
         # keep record of total_cars_passed after action=1
         if do_switch:
             self.last_switch_total_cars_passed = total_cars_passed
 
-        if self.render_mode == "human":
+        if self.render_mode == "human" and draw_frame:
             self._render_frame()
 
         reward += penalty_reward
 
-        return observation, reward, terminated, truncated, info
+        return reward, terminated
+
+    def _warm_start(self, seed: Optional[int]):
+        if self.warm_start is None:
+            raise ValueError("reset(options={\"warm_start\": True}) needs TrafficSimulatorEnv(warm_start=WarmStartPool)")  # noqa
+        if seed is not None:
+            self.warm_start_rng.seed(seed)
+        self.set_state(load_state(self, self.warm_start.sample(self.warm_start_rng)))
+        # a new future from the sampled state
+        self.traffic.seed(seed)
+
+    def get_state(self) -> tuple:
+        """
+        Snapshot of the whole simulation: clock, lights, traffic, cars, lanes and intersections.
+        Cheap to take and to restore with #set_state() as often as needed, e.g. to roll out
+        several futures from one state for lookahead planning.
+        """
+        return (self.world.clock.get_snapshot(), self.lights_control.get_snapshot(), self.traffic.get_snapshot(),
+                self.__dict__.get("last_switch_total_cars_passed", 0), self.num_frames)
+
+    def set_state(self, state: tuple):
+        clock_state, lights_state, traffic_state, self.last_switch_total_cars_passed, self.num_frames = state
+        self.world.clock.set_snapshot(clock_state)
+        self.lights_control.set_snapshot(lights_state)
+        self.traffic.set_snapshot(traffic_state)
 
     def render(self):
         if self.render_mode == "rgb_array" or self.render_mode == "human":
             return self._render_frame()
 
     def close(self):
+        if self.async_renderer is not None:
+            self.async_renderer.close()
+            self.async_renderer = None
         if self.screen is not None:
             pygame.display.quit()
             pygame.quit()
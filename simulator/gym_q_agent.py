@@ -1,15 +1,19 @@
-from datetime import datetime
-import re
 import os
 import glob
 import pickle
 from collections import defaultdict
 import random
-from typing import Dict
+from typing import Dict, Optional
 from gymnasium import Env
 import numpy as np
 
+from simulator import log
+from simulator.checkpoint import QTableCheckpointer
+from simulator.q_table import DenseQTable, ObsEncoder
 from simulator.timer import clock
+from utils.metrics import RingBuffer
+
+logger = log.get_logger("agent")
 
 
 def default_q_value():
@@ -21,6 +25,7 @@ def default_q_value():
 
 class TrafficLightQAgent:
     pkl_file_suffix = "q_table.pkl"
+    training_error_window = 10_000
 
     def __init__(
         self,
@@ -45,6 +50,8 @@ class TrafficLightQAgent:
         """
         self.env = env
         self.q_values = defaultdict(default_q_value)
+        self.changed_states: set = set()
+        self.checkpointer: Optional[QTableCheckpointer] = None
         self.read_q_table()
 
         self.lr = learning_rate
@@ -54,19 +61,17 @@ class TrafficLightQAgent:
         self.epsilon_decay = epsilon_decay
         self.final_epsilon = final_epsilon
 
-        self.training_error = []
+        # TD errors of the last steps, with running totals since the last clear
+        self.training_error = RingBuffer(self.training_error_window)
 
     def get_action(self, obs: dict) -> int:
         obs_key = self._obs_to_tuple(obs)
         if random.random() < self.epsilon:
             action = self.env.action_space.sample()
-            print(f"[agent] exploring: phase {obs['p']}, phase duration {obs['ps']}")  # noqa
-            print(f"[agent] exploring:  Chose random action {action}")
+            logger.debug("exploring: phase %d, phase duration %d, chose random action %d", obs['p'], obs['ps'], action)  # noqa
         else:
             action = int(np.argmax(self.q_values[obs_key]))
-            print(f"[agent] exploiting: state", obs_key)
-            print(f"[agent] exploiting: q value", self.q_values[obs_key])
-            print(f"[agent] exploiting: chose {action}")
+            logger.debug("exploiting: state %s, q value %s, chose %d", obs_key, self.q_values[obs_key], action)  # noqa
             # if action == 1:
             #     print(f"[agent] get_action=1 {obs_key}, Q {self.q_values[obs_key]}")  # noqa
         return action
@@ -93,6 +98,7 @@ class TrafficLightQAgent:
         # q-learning update rule, derived from the Bellman equation
         temporal_difference = reward + self.df * future_q_value - q_sa
         self.q_values[obs_key][action] = q_sa + self.lr * temporal_difference
+        self.changed_states.add(obs_key)
         # nxt = self.q_values[obs_key]
         # nxt0 = nxt[0]
         # nxt1 = nxt[1]
@@ -106,46 +112,174 @@ class TrafficLightQAgent:
     def decay_epsilon(self):
         old_epsilon = self.epsilon
         self.epsilon = max(self.final_epsilon, self.epsilon - self.epsilon_decay)  # noqa
-        print(f"[agent] epsilon decayed from {old_epsilon} to {self.epsilon}")
+        logger.info("epsilon decayed from %s to %s", old_epsilon, self.epsilon)
 
     def _obs_to_tuple(self, obs: dict) -> tuple:
         """Convert observation dictionary to a tuple to be used as keys in Q-value dict."""
         # This function now handles nested dictionaries
         return tuple((key, tuple(value.items()) if isinstance(value, dict) else value) for key, value in sorted(obs.items()))
 
+    def _world_clock(self):
+        """
+        The clock of the env's world, falls back to the global clock
+        """
+        world = getattr(self.env.unwrapped, "world", None)
+        return world.clock if world is not None else clock()
+
     def print_q_table(self):
         print("[agent] Q-values:", '-' * 30)
         for state, actions in self.q_values.items():
             print(f"State: {state}, Actions: {actions}")
         print('-----------------', '-' * 30)
 
-    def save_q_table(self, folder="./q_tables/"):
-        if os.path.exists(folder):
-            # remove the folder recursively
-            for f in glob.glob(folder + "*"):
-                os.remove(f)
-        else:
-            os.makedirs(folder)
+    def _get_checkpointer(self, folder: str) -> QTableCheckpointer:
+        if self.checkpointer is None or self.checkpointer.folder != folder:
+            if self.checkpointer is not None:
+                self.checkpointer.close()
+            self.checkpointer = QTableCheckpointer(folder)
+        return self.checkpointer
 
-        timestamp = re.sub(r'[^\w\._]', '-', datetime.now().isoformat())
-        filename = f"{folder}{timestamp}_{self.pkl_file_suffix}"
-        with open(filename, "wb") as f:
-            print(f"[agent] Saving Q-table to {filename}, DO NOT INTERRUPT!")
-            clock().pause_clock()
-            pickle.dump(self.q_values, f)
-            clock().resume_clock()
+    def save_q_table(self, folder="./q_tables/"):
+        """
+        Queue the states changed since the last save, written on a background thread
+        """
+        changes = {state: self.q_values[state].copy() for state in self.changed_states}
+        self.changed_states.clear()
+        self._get_checkpointer(folder).save(changes)
+        logger.info("Checkpoint of %d changed states queued to %s", len(changes), folder)
 
     def read_q_table(self, folder="./q_tables/"):
-        # list files in folder (str) desc by updated time, get the first one
-        files = glob.glob(folder + "*")
+        q_values = self._get_checkpointer(folder).load()
+        if q_values is not None:
+            logger.info("Loaded Q-table checkpoint %d from %s", self.checkpointer.seq, folder)  # type: ignore
+            self.q_values = defaultdict(default_q_value, q_values)
+            return
+
+        # fall back to Q-tables pickled in full by earlier versions
+        files = glob.glob(folder + "*" + self.pkl_file_suffix)
         if len(files) == 0:
-            print(f"[agent] Q-table file not found, skip loading")
+            logger.info("Q-table file not found, skip loading")
             return
 
         filename = sorted(files, key=os.path.getmtime, reverse=True)[0]
 
-        print(f"[agent] Loading Q-table from {filename}")
+        logger.info("Loading Q-table from %s", filename)
         with open(filename, "rb") as f:
-            clock().pause_clock()
+            self._world_clock().pause_clock()
             self.q_values = pickle.load(f)
-            clock().resume_clock()
+            self._world_clock().resume_clock()
+        # the first checkpoint takes the whole legacy table, later ones only the changes
+        self.changed_states.update(self.q_values.keys())
+
+    def export_q_table(self, path="./q_tables/q_table.qtab") -> DenseQTable:
+        """
+        Write the Q-table in the binary format, e.g. for DenseTrafficLightQAgent evaluators
+        """
+        encoder = ObsEncoder(self.env.observation_space)  # type: ignore
+        table = DenseQTable.from_dict(self.q_values, encoder, int(self.env.action_space.n), path)  # type: ignore # noqa
+        logger.info("Exported Q-table to %s", path)
+        return table
+
+    def close(self):
+        """
+        Wait for the pending checkpoints to be written
+        """
+        if self.checkpointer is not None:
+            self.checkpointer.close()
+            self.checkpointer = None
+
+
+class DenseTrafficLightQAgent(TrafficLightQAgent):
+    """
+    TrafficLightQAgent backed by a DenseQTable: observations are encoded to a state index
+    with a precomputed mixed-radix layout instead of being hashed as nested tuples.
+    #get_actions() and #update_batch() work on the stacked observations of a VectorEnv.
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        learning_rate: float,
+        initial_epsilon: float,
+        epsilon_decay: float,
+        final_epsilon: float,
+        discount_factor: float = 0.95,
+        q_table_path: Optional[str] = None,
+        read_only=False,
+    ):
+        """
+        env: a single env or a VectorEnv, spaces are read from its single (sub-)env
+        q_table_path: Q-table file, memory-mapped and reused if it exists, defaults to a temporary file
+        read_only: map an existing Q-table file read-only, e.g. to evaluate it
+        """
+        self.q_table_path = q_table_path
+        self.read_only = read_only
+        self.rng = np.random.default_rng()
+        super().__init__(env, learning_rate, initial_epsilon, epsilon_decay, final_epsilon, discount_factor)  # noqa
+
+    def read_q_table(self, folder="./q_tables/"):
+        observation_space = getattr(self.env, "single_observation_space", self.env.observation_space)  # noqa
+        action_space = getattr(self.env, "single_action_space", self.env.action_space)
+        self.encoder = ObsEncoder(observation_space)
+        self.num_actions = int(action_space.n)
+        self.q_table = DenseQTable(self.encoder, self.num_actions, path=self.q_table_path, read_only=self.read_only)  # noqa
+        self.q_values = self.q_table.values
+
+    def save_q_table(self, folder="./q_tables/"):
+        self.q_table.flush()
+
+    def print_q_table(self, chunk_states=1 << 20):
+        """
+        Print the visited states, the table is scanned `chunk_states` states at a time
+        so no temporary grows with the observation space
+        """
+        print("[agent] Q-values:", '-' * 30)
+        for start in range(0, self.encoder.num_states, chunk_states):
+            chunk = self.q_values[start:start + chunk_states]
+            for i in np.flatnonzero(chunk.any(axis=1)):
+                print(f"State: {self.encoder.decode(start + i)}, Actions: {chunk[i]}")
+        print('-----------------', '-' * 30)
+
+    def get_action(self, obs: dict) -> int:
+        if self.rng.random() < self.epsilon:
+            return int(self.rng.integers(self.num_actions))
+        return int(np.argmax(self.q_values[self.encoder.encode(obs)]))
+
+    def get_actions(self, obs: dict[str, np.ndarray]) -> np.ndarray:
+        states = self.encoder.encode_batch(obs)
+        actions = np.argmax(self.q_values[states], axis=1)
+        explore = self.rng.random(len(states)) < self.epsilon
+        actions[explore] = self.rng.integers(self.num_actions, size=int(explore.sum()))
+        return actions
+
+    def update(
+        self,
+        obs: Dict,
+        action: int,
+        reward: float,
+        terminated: bool,
+        next_obs: Dict,
+    ):
+        state = self.encoder.encode(obs)
+        future_q_value = (not terminated) * np.max(self.q_values[self.encoder.encode(next_obs)])
+        q_sa = self.q_values[state, action]
+        temporal_difference = reward + self.df * future_q_value - q_sa
+        self.q_values[state, action] = q_sa + self.lr * temporal_difference
+        self.training_error.append(temporal_difference)
+
+    def update_batch(
+        self,
+        obs: dict[str, np.ndarray],
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        terminated: np.ndarray,
+        next_obs: dict[str, np.ndarray],
+    ):
+        """
+        Q-learning update of a batch of transitions, updates of the same (state, action) add up
+        """
+        states = self.encoder.encode_batch(obs)
+        future_q_values = ~np.asarray(terminated, dtype=bool) * np.max(self.q_values[self.encoder.encode_batch(next_obs)], axis=1)  # noqa
+        temporal_differences = rewards + self.df * future_q_values - self.q_values[states, actions]
+        np.add.at(self.q_values, (states, actions), self.lr * temporal_differences)
+        self.training_error.extend(temporal_differences)
@@ -0,0 +1,166 @@
+from typing import Any, Optional
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv
+import numpy as np
+
+from simulator import timer
+from simulator.car_engine import CarEngine
+from simulator.config import cars_config, game_config
+from simulator.gym_env import TrafficSimulatorEnv, calculate_reward, create_phases, lane_obs_key
+from simulator.lights_control.batched import BatchedAdaptiveLightsControl
+from simulator.raster import Rasterizer
+from simulator.traffic import Traffic
+from simulator.world import World, create_world
+
+
+class TrafficSimulatorVectorEnv(VectorEnv):
+    """
+    N independent intersections stepped in lockstep, same rules as TrafficSimulatorEnv.
+    All worlds share one clock and one CarEngine: the cars of every world advance in a
+    single vectorized update, the lights, observations and rewards are computed on arrays.
+    Observations are a Dict of arrays with one entry per world, episodes autoreset.
+    """
+    metadata = {**TrafficSimulatorEnv.metadata, "autoreset": True}
+
+    def __init__(self, num_envs: int, debug_kpis=False, clock: Optional[timer.WorldClock] = None,
+                 render_mode: Optional[str] = None, render_size: Optional[tuple[int, int]] = None):
+        """
+        clock: shared clock of all worlds, defaults to a new headless clock configured like the global one
+        render_mode: "rgb_array" renders the frames of all worlds at once with a Rasterizer
+        render_size: (width, height) of the frames, the screen size by default
+        """
+        self.clock = clock if clock is not None else timer.new_clock(headless=True)
+        self.worlds: list[World] = [create_world(self.clock) for _ in range(num_envs)]
+        self.car_engine = CarEngine()
+        self.traffics = [Traffic(1, w.streets, cars_config, game_config, car_engine=self.car_engine,
+                                 debug_kpis=debug_kpis, clock=self.clock) for w in self.worlds]
+        worlds_phases = [create_phases(w.lights) for w in self.worlds]
+        self.lights_control = BatchedAdaptiveLightsControl(
+            worlds_phases, self.metadata["traffic_light_timings"], self.car_engine.lanes, clock=self.clock)
+
+        # engine index of every approach lane, one row per world in observation order
+        self.obs_keys = [lane_obs_key(s, al) for s in self.worlds[0].streets for al in s.approach_lanes]  # noqa
+        self.approach_ids = np.array([[self.car_engine.lane_index[al] for s in w.streets for al in s.approach_lanes]
+                                      for w in self.worlds], dtype=np.int64)
+        self.street_world = {s: i for i, w in enumerate(self.worlds) for s in w.streets}
+        self.last_switch_total_cars_passed = np.zeros(num_envs, dtype=np.int64)
+
+        lane_state_space = self.worlds[0].streets[0].approach_lanes[0].get_state_space()
+        self.lane_state_space = lane_state_space
+        single_observation_space = spaces.Dict({
+            "p": spaces.Discrete(start=0, n=len(worlds_phases[0])),
+            "ps": spaces.Discrete(start=0, n=self.metadata["traffic_light_timings"]["phase_max_s"]),
+            **{k: spaces.Discrete(start=0, n=lane_state_space) for k in self.obs_keys},
+        })
+        single_action_space = spaces.Discrete(start=0, n=4)  # phases
+        super().__init__(num_envs, single_observation_space, single_action_space)
+        self._actions = np.zeros(num_envs, dtype=np.int64)
+
+        if render_mode is not None and render_mode != "rgb_array":
+            raise ValueError(f"Invalid render_mode. Expected rgb_array, got {render_mode}")
+        self.render_mode = render_mode
+        self.rasterizer: Optional[Rasterizer] = None
+        self.frames: Optional[np.ndarray] = None
+        if render_mode == "rgb_array":
+            width, height = render_size if render_size is not None else (None, None)
+            self.rasterizer = Rasterizer([w.streets for w in self.worlds], width, height)
+
+    def _get_obs(self) -> dict[str, np.ndarray]:
+        """
+        Observations of all worlds at once, lane queues binned like Lane.get_state()
+        """
+        lanes_q = np.minimum(np.ceil(self.car_engine.lane_num_stopped[self.approach_ids] / 4).astype(np.int64),
+                             self.lane_state_space - 1)
+        phase_max_s = self.metadata["traffic_light_timings"]["phase_max_s"]
+        return {
+            "p": self.lights_control.current_phase.copy(),
+            "ps": np.minimum((self.lights_control.get_phase_time() / 1000).astype(np.int64), phase_max_s - 1),
+            **{k: lanes_q[:, j] for j, k in enumerate(self.obs_keys)},
+        }
+
+    def _reset_world(self, i: int, seed: Optional[int] = None):
+        self.lights_control.reset(i, seed=seed)
+        self.traffics[i].reset(seed=seed)
+        self.last_switch_total_cars_passed[i] = 0
+
+    def reset_wait(self, seed: Optional[int | list[int]] = None, options: Optional[dict] = None) -> tuple[dict, dict]:
+        """
+        An int seed gives world i the seed + i, like gymnasium's own vector envs
+        """
+        if seed is None:
+            seeds: list[Optional[int]] = [None] * self.num_envs
+        elif isinstance(seed, int):
+            seeds = [seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+        if len(seeds) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} seeds, got {len(seeds)}")
+
+        for i, s in enumerate(seeds):
+            self._reset_world(i, seed=s)
+        return self._get_obs(), {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64)
+
+    def step_wait(self) -> tuple[dict, np.ndarray, np.ndarray, np.ndarray, dict]:
+        actions = self._actions
+        do_switch = actions == self.lights_control.current_phase
+
+        self.lights_control.to_phase(actions)
+        self.clock.advance()
+        self.lights_control.next_tick()
+        clock_ms = self.clock.get_ticks()
+        for traffic in self.traffics:
+            traffic.spawn_cars()
+        for car in self.car_engine.next_tick(clock_ms, self.lights_control.get_lane_stop()):
+            self.traffics[self.street_world[car.street]].finish_car(car, clock_ms)
+        if self.traffics[0].debug_kpis:
+            for traffic in self.traffics:
+                traffic.check_kpis()
+
+        observation = self._get_obs()
+        lanes_stopped = self.car_engine.lane_num_stopped[self.approach_ids]
+        total_waiting_ms = self.car_engine.lane_waiting_ms[self.approach_ids].sum(axis=1)
+        total_cars_passed = np.array([t.calc_passed_cars() for t in self.traffics], dtype=np.int64)
+        reward = calculate_reward(lanes_stopped.sum(axis=1), total_waiting_ms,
+                                  total_cars_passed - self.last_switch_total_cars_passed,
+                                  self.lights_control.get_phase_time())
+
+        finished_cars = np.array([t.calc_finished_cars() for t in self.traffics])
+        num_cars = np.array([len(t.all_cars) for t in self.traffics])
+        terminated = ((finished_cars > 0) & (num_cars <= 0)) | \
+            (lanes_stopped > self.metadata["max_queue_length"]).any(axis=1)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        self.last_switch_total_cars_passed[do_switch] = total_cars_passed[do_switch]
+
+        infos: dict[str, Any] = {}
+        done = np.flatnonzero(terminated | truncated)
+        if len(done) > 0:
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            for i in done:
+                final_observation[i] = {k: v[i] for k, v in observation.items()}
+                self._reset_world(i)
+            reset_observation = self._get_obs()
+            for k, v in observation.items():
+                v[done] = reset_observation[k][done]
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = terminated | truncated
+            infos["final_info"] = np.array([{} if d else None for d in terminated | truncated], dtype=object)
+            infos["_final_info"] = terminated | truncated
+
+        return observation, reward, terminated, truncated, infos
+
+    def render(self) -> Optional[np.ndarray]:
+        """
+        A (num_envs, height, width, 3) uint8 array, reused by the next render
+        """
+        if self.rasterizer is None:
+            return None
+        for i in range(self.num_envs):
+            self.lights_control.sync_lights(i)
+        self.frames = self.rasterizer.render(self.frames, car_engine=self.car_engine)
+        return self.frames
+
+    def close_extras(self, **kwargs):
+        pass
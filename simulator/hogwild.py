@@ -0,0 +1,164 @@
+import multiprocessing as mp
+from typing import Callable, Optional
+from gymnasium import Env
+import numpy as np
+
+from simulator import log
+from simulator.gym_q_agent import DenseTrafficLightQAgent
+from simulator.q_table import DenseQTable, ObsEncoder
+
+logger = log.get_logger("train")
+
+
+class SharedTrainingStats:
+    """
+    Training statistics of all workers in shared memory, one row per worker so no locking is needed
+    """
+    columns = ["episodes", "steps", "reward_sum", "error_sum", "error_count"]
+
+    def __init__(self, num_workers: int, ctx):
+        self.num_workers = num_workers
+        self.buffer = ctx.RawArray("d", num_workers * len(self.columns))
+
+    def view(self) -> np.ndarray:
+        return np.frombuffer(self.buffer, dtype=np.float64).reshape(self.num_workers, len(self.columns))  # noqa
+
+    def totals(self) -> dict[str, float]:
+        return dict(zip(self.columns, self.view().sum(axis=0).tolist()))
+
+
+def _epsilon(episode: int, start_epsilon: float, epsilon_decay: float, final_epsilon: float):
+    """
+    Epsilon of the global episode count, the same schedule as TrafficLightQAgent.decay_epsilon()
+    """
+    return max(final_epsilon, start_epsilon - epsilon_decay * episode)
+
+
+def _train_worker(worker_i: int, env_fn: Callable[[], Env], q_table_path: str, hyperparameters: dict,
+                  n_episodes: int, next_episode, stats_buffer, num_workers: int, seed: Optional[int]):
+    env = env_fn()
+    agent = DenseTrafficLightQAgent(
+        env=env,
+        learning_rate=hyperparameters["learning_rate"],
+        initial_epsilon=hyperparameters["start_epsilon"],
+        epsilon_decay=hyperparameters["epsilon_decay"],
+        final_epsilon=hyperparameters["final_epsilon"],
+        discount_factor=hyperparameters["discount_factor"],
+        q_table_path=q_table_path,
+    )
+    stats = np.frombuffer(stats_buffer, dtype=np.float64).reshape(num_workers, -1)[worker_i]
+
+    while True:
+        # claim the next episode of the shared schedule
+        with next_episode.get_lock():
+            episode = next_episode.value
+            if episode >= n_episodes:
+                break
+            next_episode.value += 1
+        agent.epsilon = _epsilon(episode, hyperparameters["start_epsilon"],
+                                 hyperparameters["epsilon_decay"], hyperparameters["final_epsilon"])
+
+        obs, info = env.reset(seed=None if seed is None else seed + worker_i)
+        done = False
+        steps = 0
+        reward_sum = 0.0
+        while not done:
+            action = agent.get_action(obs)
+            next_obs, reward, terminated, truncated, info = env.step(action)
+            # lock-free update of the shared table (Hogwild), rare lost updates are tolerated
+            agent.update(obs, action, float(reward), terminated, next_obs)
+            done = terminated or truncated
+            obs = next_obs
+            steps += 1
+            reward_sum += float(reward)
+
+        stats[1] += steps
+        stats[2] += reward_sum
+        stats[3] += agent.training_error.total
+        stats[4] += agent.training_error.count
+        agent.training_error.clear()
+        stats[0] += 1
+
+    agent.save_q_table()
+    env.close()
+
+
+class HogwildQTrainer:
+    """
+    Tabular Q-learning with several worker processes, each running its own simulator.
+    All workers update one DenseQTable file mapped shared into every process, without locks.
+    Episodes are claimed from one shared counter, which also drives the epsilon schedule.
+    """
+
+    def __init__(self, env_fn: Callable[[], Env], q_table_path: str, num_workers: int, n_episodes: int,
+                 learning_rate: float, start_epsilon: float, epsilon_decay: float, final_epsilon: float,
+                 discount_factor: float = 0.95, seed: Optional[int] = None, context: Optional[str] = None):
+        """
+        env_fn: creates the env of a worker, picklable unless the context is "fork"
+        seed: worker i resets every episode with seed + i, like gym_train.py with a fixed seed
+        """
+        self.env_fn = env_fn
+        self.q_table_path = q_table_path
+        self.num_workers = num_workers
+        self.n_episodes = n_episodes
+        self.hyperparameters = {
+            "learning_rate": learning_rate,
+            "start_epsilon": start_epsilon,
+            "epsilon_decay": epsilon_decay,
+            "final_epsilon": final_epsilon,
+            "discount_factor": discount_factor,
+        }
+        self.seed = seed
+        self.ctx = mp.get_context(context)
+        self.next_episode = self.ctx.Value("q", 0)
+        self.stats = SharedTrainingStats(num_workers, self.ctx)
+
+        # create the Q-table file up front, the workers only open it
+        env = env_fn()
+        DenseQTable(ObsEncoder(env.observation_space), int(env.action_space.n), path=q_table_path).flush()  # type: ignore # noqa
+        env.close()
+
+    def epsilon(self):
+        return _epsilon(self.next_episode.value, self.hyperparameters["start_epsilon"],
+                        self.hyperparameters["epsilon_decay"], self.hyperparameters["final_epsilon"])
+
+    def report(self, last: dict[str, float]) -> dict[str, float]:
+        """
+        Print the progress since the `last` totals, returns the current totals
+        """
+        totals = self.stats.totals()
+        episodes = totals["episodes"] - last.get("episodes", 0)
+        error_count = totals["error_count"] - last.get("error_count", 0)
+        mean_reward = (totals["reward_sum"] - last.get("reward_sum", 0)) / max(1, totals["steps"] - last.get("steps", 0))  # noqa
+        mean_error = (totals["error_sum"] - last.get("error_sum", 0)) / max(1, error_count)
+        logger.info("episodes=%d/%d (+%d), epsilon=%.3f, Mean Reward = %s, Average Training Error = %s",
+                    totals["episodes"], self.n_episodes, episodes, self.epsilon(), mean_reward, mean_error)
+        return totals
+
+    def run(self, report_every_s=10.0):
+        processes = [
+            self.ctx.Process(target=_train_worker, name=f"HogwildQTrainer-{i}",
+                             args=(i, self.env_fn, self.q_table_path, self.hyperparameters, self.n_episodes,
+                                   self.next_episode, self.stats.buffer, self.num_workers, self.seed))
+            for i in range(self.num_workers)
+        ]
+        for p in processes:
+            p.start()
+
+        last: dict[str, float] = {}
+        try:
+            while any(p.is_alive() for p in processes):
+                for p in processes:
+                    p.join(timeout=report_every_s / len(processes))
+                last = self.report(last)
+        except KeyboardInterrupt:
+            for p in processes:
+                p.terminate()
+            raise
+        finally:
+            for p in processes:
+                p.join()
+        failed = [p.name for p in processes if p.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Workers failed: {failed}")
+        return self.stats.totals()
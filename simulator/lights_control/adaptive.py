@@ -1,6 +1,6 @@
 import random
 from typing import Optional
-from simulator.timer import clock
+from simulator import timer
 from .light import Light
 
 
@@ -14,9 +14,11 @@ class AdaptiveLightsControl:
     Adaptive, meaning no fixed time, it doesn't change light unless #next_phase() is called
     """
 
-    def __init__(self, lights_phases_config: list[Phase], timings: dict):
+    def __init__(self, lights_phases_config: list[Phase], timings: dict, clock: Optional[timer.WorldClock] = None):
+        self.clock = clock if clock is not None else timer.clock()
+        self.rng = random.Random()
         self.phases = lights_phases_config
-        self.phase_start_ms = clock().get_ticks()
+        self.phase_start_ms = self.clock.get_ticks()
         self.phase_min_s: int = timings["phase_min_s"]
         self.phase_max_s: int = timings["phase_max_s"]
         self.phase_yellow_s: int = timings["phase_yellow_s"]
@@ -28,9 +30,26 @@ class AdaptiveLightsControl:
         """
         Reset the lights control to a random phase
         """
-        random.seed(seed)
-        self.current_phase_i = random.randint(0, len(self.phases) - 1)
-        self.phase_start_ms = clock().get_ticks()
+        self.rng.seed(seed)
+        self.current_phase_i = self.rng.randint(0, len(self.phases) - 1)
+        self.phase_start_ms = self.clock.get_ticks()
+        self.next_phase_started_ms = None
+        self.next_phase_i = None
+
+    def get_snapshot(self) -> tuple:
+        """
+        Phase timing, RNG and the colors of the lights, see #set_snapshot()
+        """
+        lights = tuple(light for phase in self.phases for light in phase.lights)
+        return (self.rng.getstate(), self.current_phase_i, self.phase_start_ms, self.next_phase_started_ms,
+                self.next_phase_i, tuple(light.color for light in lights))
+
+    def set_snapshot(self, state: tuple):
+        rng_state, self.current_phase_i, self.phase_start_ms, self.next_phase_started_ms, self.next_phase_i, colors = state  # noqa
+        self.rng.setstate(rng_state)
+        lights = [light for phase in self.phases for light in phase.lights]
+        for light, color in zip(lights, colors):
+            light.color = color
 
     def to_phase(self, phase_i: int):
         if phase_i == self.current_phase_i:
@@ -40,7 +59,7 @@ class AdaptiveLightsControl:
             # already in the middle of a phase change
             return
 
-        clock_ms = clock().get_ticks()
+        clock_ms = self.clock.get_ticks()
         self.next_phase_started_ms = clock_ms
         self.next_phase_i = phase_i
 
@@ -55,13 +74,13 @@ class AdaptiveLightsControl:
         if self.next_phase_i is None:
             return
         self.current_phase_i = self.next_phase_i
-        self.phase_start_ms = clock().get_ticks()
+        self.phase_start_ms = self.clock.get_ticks()
         self.next_phase_i = None
         self.next_phase_started_ms = None
 
     def next_tick(self):
         if self.next_phase_started_ms is not None:
-            clock_ms = clock().get_ticks()
+            clock_ms = self.clock.get_ticks()
             if clock_ms - self.next_phase_started_ms >= self.phase_yellow_s * 1000:
                 self.switch_to_next_phase()
 
@@ -77,13 +96,21 @@ class AdaptiveLightsControl:
                 for light in phase.lights:
                     light.set_red()
 
-        overtime = clock().get_ticks() - self.phase_start_ms > self.phase_max_s * 1000
+        overtime = self.clock.get_ticks() - self.phase_start_ms > self.phase_max_s * 1000
         return overtime
 
+    def next_change_ms(self) -> Optional[float]:
+        """
+        When the yellow light of a phase change ends, None if the lights only change on #to_phase()
+        """
+        if self.next_phase_started_ms is None:
+            return None
+        return self.next_phase_started_ms + self.phase_yellow_s * 1000
+
     def get_phase_time(self):
         if self.next_phase_started_ms is not None:
             # print('[get_phase_time] yellow', self.next_phase_started_ms, self.phase_start_ms)  # noqa
             return self.next_phase_started_ms - self.phase_start_ms
         else:
-            # print('[get_phase_time] green', clock().get_ticks(), self.phase_start_ms)  # noqa
-            return clock().get_ticks() - self.phase_start_ms
+            # print('[get_phase_time] green', self.clock.get_ticks(), self.phase_start_ms)  # noqa
+            return self.clock.get_ticks() - self.phase_start_ms
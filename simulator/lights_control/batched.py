@@ -0,0 +1,108 @@
+import random
+from typing import Optional
+import numpy as np
+
+from simulator import timer
+from simulator.street import Lane
+from .adaptive import Phase
+
+
+class BatchedAdaptiveLightsControl:
+    """
+    AdaptiveLightsControl for many worlds stepped in lockstep on one clock.
+    Phase state lives in arrays, one entry per world, and the lights of every lane
+    are evaluated at once, see #get_lane_stop().
+    """
+
+    def __init__(self, worlds_phases: list[list[Phase]], timings: dict, lanes: list[Lane],
+                 clock: Optional[timer.WorldClock] = None):
+        """
+        lanes: every lane of every world, in the order lane_stop arrays are expected (e.g. CarEngine.lanes)
+        """
+        self.clock = clock if clock is not None else timer.clock()
+        self.worlds_phases = worlds_phases
+        self.num_worlds = len(worlds_phases)
+        self.num_phases = len(worlds_phases[0])
+        self.phase_min_s: int = timings["phase_min_s"]
+        self.phase_max_s: int = timings["phase_max_s"]
+        self.phase_yellow_s: int = timings["phase_yellow_s"]
+        self.rngs = [random.Random() for _ in range(self.num_worlds)]
+
+        self.current_phase = np.zeros(self.num_worlds, dtype=np.int64)
+        self.phase_start_ms = np.zeros(self.num_worlds)
+        self.next_phase_started_ms = np.full(self.num_worlds, np.nan)
+        self.next_phase = np.full(self.num_worlds, -1, dtype=np.int64)
+
+        # the world and phase that turn the light of each lane green
+        light_phase = {}
+        for w, phases in enumerate(worlds_phases):
+            for p, phase in enumerate(phases):
+                for light in phase.lights:
+                    light_phase[id(light)] = (w, p)
+        lane_phase = [light_phase.get(id(l.light), (-1, -1)) for l in lanes]
+        self.lane_has_light = np.array([l.light is not None for l in lanes], dtype=bool)  # noqa
+        self.lane_world = np.array([w for w, _ in lane_phase], dtype=np.int64)
+        self.lane_phase = np.array([p for _, p in lane_phase], dtype=np.int64)
+
+    def reset(self, world_i: int, seed: Optional[int] = None):
+        """
+        Reset the lights control of one world to a random phase
+        """
+        rng = self.rngs[world_i]
+        rng.seed(seed)
+        self.current_phase[world_i] = rng.randint(0, self.num_phases - 1)
+        self.phase_start_ms[world_i] = self.clock.get_ticks()
+        self.next_phase_started_ms[world_i] = np.nan
+        self.next_phase[world_i] = -1
+
+    def to_phase(self, phases: np.ndarray):
+        """
+        Start a yellow light in every world asked for another phase and not already changing
+        """
+        change = (phases != self.current_phase) & np.isnan(self.next_phase_started_ms)  # noqa
+        self.next_phase_started_ms[change] = self.clock.get_ticks()
+        self.next_phase[change] = phases[change]
+
+    def next_tick(self) -> np.ndarray:
+        """
+        Switch the worlds whose yellow light is over, returns which worlds stayed too long in a phase
+        """
+        clock_ms = self.clock.get_ticks()
+        switch = clock_ms - self.next_phase_started_ms >= self.phase_yellow_s * 1000  # nan compares False # noqa
+        self.current_phase[switch] = self.next_phase[switch]
+        self.phase_start_ms[switch] = clock_ms
+        self.next_phase[switch] = -1
+        self.next_phase_started_ms[switch] = np.nan
+
+        return clock_ms - self.phase_start_ms > self.phase_max_s * 1000
+
+    def get_phase_time(self) -> np.ndarray:
+        return np.where(np.isnan(self.next_phase_started_ms),
+                        self.clock.get_ticks() - self.phase_start_ms,
+                        self.next_phase_started_ms - self.phase_start_ms)
+
+    def get_lane_stop(self) -> np.ndarray:
+        """
+        Which lanes have a yellow or red light
+        """
+        world = self.lane_world
+        in_phase = world >= 0
+        green = in_phase & (self.lane_phase == self.current_phase[world]) & \
+            np.isnan(self.next_phase_started_ms[world])
+        return self.lane_has_light & ~green
+
+    def sync_lights(self, world_i: int):
+        """
+        Write the colors to the Light objects of one world, e.g. before rendering it
+        """
+        phases = self.worlds_phases[world_i]
+        current_phase = phases[self.current_phase[world_i]]
+        for phase in phases:
+            if phase != current_phase:
+                for light in phase.lights:
+                    light.set_red()
+        for light in current_phase.lights:
+            if np.isnan(self.next_phase_started_ms[world_i]):
+                light.set_green()
+            else:
+                light.set_yellow()
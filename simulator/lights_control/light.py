@@ -12,16 +12,30 @@ class Light:
         self.color = "red"
 
 
+def create_lights() -> dict[str, Light]:
+    """
+    Create an independent set of traffic lights, one per approach direction and turn.
+    Left turns share the light of the through lane.
+    """
+    lights = {}
+    for direction in ["north", "south", "west", "east"]:
+        lights[f"{direction}_through"] = Light()
+        lights[f"{direction}_left"] = lights[f"{direction}_through"]
+        lights[f"{direction}_right"] = Light()
+    return lights
+
+
 # built in traffic lights, users can create more if needed
-lit_north_through = Light()
-lit_north_left = lit_north_through
-lit_north_right = Light()
-lit_south_through = Light()
-lit_south_left = lit_south_through
-lit_south_right = Light()
-lit_west_through = Light()
-lit_west_left = lit_west_through
-lit_west_right = Light()
-lit_east_through = Light()
-lit_east_left = lit_east_through
-lit_east_right = Light()
+default_lights = create_lights()
+lit_north_through = default_lights["north_through"]
+lit_north_left = default_lights["north_left"]
+lit_north_right = default_lights["north_right"]
+lit_south_through = default_lights["south_through"]
+lit_south_left = default_lights["south_left"]
+lit_south_right = default_lights["south_right"]
+lit_west_through = default_lights["west_through"]
+lit_west_left = default_lights["west_left"]
+lit_west_right = default_lights["west_right"]
+lit_east_through = default_lights["east_through"]
+lit_east_left = default_lights["east_left"]
+lit_east_right = default_lights["east_right"]
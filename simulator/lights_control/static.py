@@ -1,6 +1,6 @@
 import math
-from pygame import time
-from simulator.timer import clock
+from typing import Optional
+from simulator import timer
 
 
 class StaticPhase:
@@ -14,11 +14,26 @@ class StaticLightsControl:
     Static, meaning time is static
     """
 
-    def __init__(self, lights_phases_config: list[StaticPhase]):
+    def __init__(self, lights_phases_config: list[StaticPhase], clock: Optional[timer.WorldClock] = None):
+        self.clock = clock if clock is not None else timer.clock()
         self.phases = lights_phases_config
 
+    def next_change_ms(self) -> float:
+        """
+        When the current phase ends
+        """
+        clock_ms = self.clock.get_ticks()
+        cycle_ms = sum([phase.duration_s for phase in self.phases]) * 1000
+        cycle_start_ms = clock_ms - clock_ms % cycle_ms
+        end_ms = cycle_start_ms
+        for phase in self.phases:
+            end_ms += phase.duration_s * 1000
+            if end_ms > clock_ms:
+                return end_ms
+        return cycle_start_ms + cycle_ms
+
     def next_tick(self):
-        clock_ms = clock().get_ticks()
+        clock_ms = self.clock.get_ticks()
         total_duration_s = sum([phase.duration_s for phase in self.phases])
         phase_ms = clock_ms % (total_duration_s * 1000)
 
@@ -0,0 +1,164 @@
+import atexit
+import json
+import sys
+import threading
+import time
+from typing import Any, Optional, TextIO
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+level_names = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Record:
+    """
+    One log record, the message is only formatted when a sink writes it
+    """
+    __slots__ = ["time", "level", "logger", "msg", "args", "fields"]
+
+    def __init__(self, level: int, logger: str, msg: str, args: tuple, fields: dict):
+        self.time = time.time()
+        self.level = level
+        self.logger = logger
+        self.msg = msg
+        self.args = args
+        self.fields = fields
+
+    def message(self) -> str:
+        return self.msg % self.args if self.args else self.msg
+
+    def to_text(self) -> str:
+        fields = "".join(f", {k}={v}" for k, v in self.fields.items())
+        return f"[{self.logger}] {self.message()}{fields}"
+
+    def to_json(self) -> str:
+        return json.dumps({"t": self.time, "level": level_names.get(self.level, self.level),
+                           "logger": self.logger, "msg": self.message(), **self.fields},
+                          default=lambda o: o.item() if hasattr(o, "item") else str(o))
+
+
+class StreamSink:
+    """
+    Writes every record as a line of text, e.g. to the terminal
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def emit(self, record: Record):
+        print(record.to_text(), file=self.stream or sys.stdout)
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class BatchedFileSink:
+    """
+    Appends records as JSON lines to a file, in batches of `batch_size` records
+    or every `flush_s` seconds, whichever comes first
+    """
+
+    def __init__(self, path: str, batch_size=1000, flush_s=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.batch: list[Record] = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def emit(self, record: Record):
+        with self.lock:
+            self.batch.append(record)
+            if len(self.batch) < self.batch_size and time.monotonic() - self.last_flush < self.flush_s:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+            self.last_flush = time.monotonic()
+        if batch:
+            with open(self.path, "a") as f:
+                f.write("".join(r.to_json() + "\n" for r in batch))
+
+
+class Logger:
+    """
+    Leveled logger. Disabled levels return before any formatting: pass the values as
+    %-style args or fields instead of f-strings, and guard costly values with #is_enabled().
+    sample_every=N emits every Nth record of a message, every_s=S at most one per S seconds.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counters: dict[str, int] = {}
+        self.last_emit_s: dict[str, float] = {}
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= _level
+
+    def log(self, level: int, msg: str, *args, sample_every: int = 1, every_s: float = 0, **fields: Any):
+        if level < _level:
+            return
+        if sample_every > 1:
+            n = self.counters.get(msg, 0)
+            self.counters[msg] = n + 1
+            if n % sample_every != 0:
+                return
+        if every_s > 0:
+            now = time.monotonic()
+            if now - self.last_emit_s.get(msg, -every_s) < every_s:
+                return
+            self.last_emit_s[msg] = now
+        record = Record(level, self.name, msg, args, fields)
+        for sink in _sinks:
+            sink.emit(record)
+
+    def debug(self, msg: str, *args, **kwargs):
+        if DEBUG >= _level:
+            self.log(DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg: str, *args, **kwargs):
+        if INFO >= _level:
+            self.log(INFO, msg, *args, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs):
+        if WARNING >= _level:
+            self.log(WARNING, msg, *args, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs):
+        if ERROR >= _level:
+            self.log(ERROR, msg, *args, **kwargs)
+
+
+_level = INFO
+_sinks: list = [StreamSink()]
+_loggers: dict[str, Logger] = {}
+
+
+def get_logger(name: str) -> Logger:
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
+
+
+def configure(level=INFO, path: Optional[str] = None, stream=True):
+    """
+    Set the level of all loggers and where records go: the terminal and/or a JSON lines file
+    """
+    global _level, _sinks
+    flush()
+    _level = level
+    _sinks = []
+    if stream:
+        _sinks.append(StreamSink())
+    if path is not None:
+        _sinks.append(BatchedFileSink(path))
+
+
+def flush():
+    for sink in _sinks:
+        sink.flush()
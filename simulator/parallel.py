@@ -0,0 +1,202 @@
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Optional
+from gymnasium import Env, spaces
+from gymnasium.vector import VectorEnv
+import numpy as np
+
+
+def _obs_keys(space: spaces.Space) -> list[str]:
+    if not isinstance(space, spaces.Dict) or not all(isinstance(s, spaces.Discrete) for s in space.values()):
+        raise ValueError(f"Expected a Dict of Discrete observation space, got {space}")
+    return list(space.keys())
+
+
+def _make_buffers(ctx, num_envs: int, num_keys: int) -> dict[str, Any]:
+    return {
+        "obs": ctx.RawArray("q", num_envs * num_keys),
+        "final_obs": ctx.RawArray("q", num_envs * num_keys),
+        "action": ctx.RawArray("q", num_envs),
+        "reward": ctx.RawArray("d", num_envs),
+        "terminated": ctx.RawArray("b", num_envs),
+        "truncated": ctx.RawArray("b", num_envs),
+    }
+
+
+def _view_buffers(buffers: dict[str, Any], num_envs: int) -> dict[str, np.ndarray]:
+    views = {
+        "obs": np.frombuffer(buffers["obs"], dtype=np.int64).reshape(num_envs, -1),
+        "final_obs": np.frombuffer(buffers["final_obs"], dtype=np.int64).reshape(num_envs, -1),
+        "action": np.frombuffer(buffers["action"], dtype=np.int64),
+        "reward": np.frombuffer(buffers["reward"], dtype=np.float64),
+        "terminated": np.frombuffer(buffers["terminated"], dtype=np.int8),
+        "truncated": np.frombuffer(buffers["truncated"], dtype=np.int8),
+    }
+    return views
+
+
+# sent instead of a step info equal to the previous one of the same env
+_SAME_INFO = 0
+
+
+def _same_info(a: dict, b: Optional[dict]) -> bool:
+    try:
+        return b is not None and bool(a == b)
+    except ValueError:
+        # e.g. array values, compare them as changed
+        return False
+
+
+def _worker(index: int, env_fn: Callable[[], Env], pipe: Connection, buffers: dict[str, Any], num_envs: int):
+    """
+    Owns one env, waits for short commands on the pipe and exchanges the data through the shared buffers
+    """
+    env = env_fn()
+    keys = _obs_keys(env.observation_space)
+    views = _view_buffers(buffers, num_envs)
+    obs_row = views["obs"][index]
+
+    def write_obs(row: np.ndarray, obs: dict):
+        for j, k in enumerate(keys):
+            row[j] = obs[k]
+
+    last_info: Optional[dict] = None
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                obs, info = env.reset(**data)
+                write_obs(obs_row, obs)
+                last_info = info
+                pipe.send(info)
+            elif command == "step":
+                obs, reward, terminated, truncated, info = env.step(int(views["action"][index]))
+                views["reward"][index] = reward
+                views["terminated"][index] = terminated
+                views["truncated"][index] = truncated
+                if terminated or truncated:
+                    # autoreset, the last observation of the episode goes to final_obs
+                    write_obs(views["final_obs"][index], obs)
+                    final_info = info
+                    obs, info = env.reset()
+                    info = {"final_info": final_info, **info}
+                write_obs(obs_row, obs)
+                # infos rarely change between steps (e.g. {"debug": 0, "frames": N}), skip pickling them
+                if _same_info(info, last_info):
+                    pipe.send(_SAME_INFO)
+                else:
+                    last_info = info
+                    pipe.send(info)
+            elif command == "close":
+                break
+            else:
+                raise ValueError(f"Unknown command {command}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+        pipe.close()
+
+
+class SharedMemoryVectorEnv(VectorEnv):
+    """
+    Runs every env in its own process, like gymnasium's AsyncVectorEnv with shared memory.
+    Actions, observations, rewards and done flags are exchanged through shared NumPy
+    buffers, the pipes only carry short commands and the infos that changed since the last step.
+    Observation spaces must be a Dict of Discrete, e.g. TrafficSimulatorEnv.
+    """
+
+    def __init__(self, env_fns: list[Callable[[], Env]], context: Optional[str] = None):
+        """
+        env_fns: one function per worker creating its env, picklable unless the context is "fork"
+        context: multiprocessing start method, defaults to the platform default
+        """
+        dummy_env = env_fns[0]()
+        single_observation_space = dummy_env.observation_space
+        single_action_space = dummy_env.action_space
+        dummy_env.close()
+        del dummy_env
+        self.keys = _obs_keys(single_observation_space)
+
+        num_envs = len(env_fns)
+        super().__init__(num_envs, single_observation_space, single_action_space)
+        ctx = mp.get_context(context)
+        self.buffers = _make_buffers(ctx, num_envs, len(self.keys))
+        self.views = _view_buffers(self.buffers, num_envs)
+
+        # the last info of every env, workers only send an info when it changes
+        self.last_infos: list[dict] = [{} for _ in range(num_envs)]
+        self.pipes: list[Connection] = []
+        self.processes: list[mp.process.BaseProcess] = []
+        for i, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker, name=f"SharedMemoryVectorEnv-{i}",
+                                  args=(i, env_fn, child_pipe, self.buffers, num_envs), daemon=True)
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+            process.start()
+            child_pipe.close()
+
+    def _obs_dict(self, rows: np.ndarray) -> dict[str, np.ndarray]:
+        rows = rows.copy()
+        return {k: rows[:, j] for j, k in enumerate(self.keys)}
+
+    def _collect_infos(self) -> dict:
+        infos: dict = {}
+        for i, pipe in enumerate(self.pipes):
+            info = pipe.recv()
+            if info != _SAME_INFO:
+                self.last_infos[i] = info
+            if self.last_infos[i]:
+                infos = self._add_info(infos, self.last_infos[i], i)
+        return infos
+
+    def reset_async(self, seed: Optional[int | list[int]] = None, options: Optional[dict] = None):
+        """
+        An int seed gives env i the seed + i, like gymnasium's own vector envs
+        """
+        if seed is None or isinstance(seed, int):
+            seeds = [None if seed is None else seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+        if len(seeds) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} seeds, got {len(seeds)}")
+        for pipe, s in zip(self.pipes, seeds):
+            pipe.send(("reset", {"seed": s, "options": options}))
+
+    def reset_wait(self, seed=None, options=None) -> tuple[dict, dict]:
+        infos = self._collect_infos()
+        return self._obs_dict(self.views["obs"]), infos
+
+    def step_async(self, actions):
+        self.views["action"][:] = actions
+        for pipe in self.pipes:
+            pipe.send(("step", None))
+
+    def step_wait(self) -> tuple[dict, np.ndarray, np.ndarray, np.ndarray, dict]:
+        infos = self._collect_infos()
+        terminated = self.views["terminated"].astype(bool)
+        truncated = self.views["truncated"].astype(bool)
+        done = terminated | truncated
+        if done.any():
+            final_observation = np.full(self.num_envs, None, dtype=object)
+            final_obs = self.views["final_obs"]
+            for i in np.flatnonzero(done):
+                final_observation[i] = {k: final_obs[i, j] for j, k in enumerate(self.keys)}
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = done
+        return self._obs_dict(self.views["obs"]), self.views["reward"].copy(), terminated, truncated, infos
+
+    def close_extras(self, timeout: Optional[float] = None, terminate: bool = False):
+        for pipe in self.pipes:
+            if not pipe.closed:
+                try:
+                    pipe.send(("close", None))
+                except (BrokenPipeError, EOFError):
+                    pass
+        for process in self.processes:
+            if terminate:
+                process.terminate()
+            process.join(timeout)
+        for pipe in self.pipes:
+            pipe.close()
@@ -0,0 +1,177 @@
+import json
+import os
+import struct
+import tempfile
+from typing import Optional
+from gymnasium import spaces
+import numpy as np
+
+
+class ObsEncoder:
+    """
+    Mixed-radix encoding of a Dict of Discrete observations into one integer state index.
+    The layout is computed once from the observation space, the last key varies fastest.
+    Values outside a space are clipped into it, e.g. a phase held longer than phase_max_s.
+    """
+
+    def __init__(self, observation_space: spaces.Dict):
+        if not isinstance(observation_space, spaces.Dict) or \
+                not all(isinstance(s, spaces.Discrete) for s in observation_space.values()):
+            raise ValueError(f"Expected a Dict of Discrete observation space, got {observation_space}")  # noqa
+        keys = list(observation_space.keys())
+        self._init_layout(keys,
+                          [int(observation_space[k].start) for k in keys],  # type: ignore
+                          [int(observation_space[k].n) for k in keys])  # type: ignore
+
+    @classmethod
+    def from_layout(cls, keys: list[str], starts: list[int], sizes: list[int]) -> "ObsEncoder":
+        encoder = cls.__new__(cls)
+        encoder._init_layout(keys, starts, sizes)
+        return encoder
+
+    def _init_layout(self, keys: list[str], starts: list[int], sizes: list[int]):
+        self.keys = list(keys)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.sizes = np.array(sizes, dtype=np.int64)
+        self.strides = np.ones(len(self.keys), dtype=np.int64)
+        for i in range(len(self.keys) - 2, -1, -1):
+            self.strides[i] = self.strides[i + 1] * self.sizes[i + 1]
+        self.num_states = int(self.strides[0] * self.sizes[0])
+        # plain ints for the single observation path
+        self._layout = list(zip(self.keys, self.starts.tolist(), (self.sizes - 1).tolist(), self.strides.tolist()))
+
+    def layout(self) -> dict:
+        return {"keys": self.keys, "starts": self.starts.tolist(), "sizes": self.sizes.tolist()}
+
+    def encode(self, obs: dict) -> int:
+        index = 0
+        for key, start, max_value, stride in self._layout:
+            value = int(obs[key]) - start
+            index += min(max(value, 0), max_value) * stride
+        return index
+
+    def encode_batch(self, obs: dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Encode a batch of observations, e.g. from a VectorEnv: one array per key
+        """
+        values = np.stack([np.asarray(obs[k], dtype=np.int64) for k in self.keys], axis=-1)
+        values = np.clip(values - self.starts, 0, self.sizes - 1)
+        return values @ self.strides
+
+    def decode(self, index: int) -> dict[str, int]:
+        values = (index // self.strides) % self.sizes + self.starts
+        return dict(zip(self.keys, values.tolist()))
+
+
+# binary Q-table file: magic, version, header length, JSON header, values aligned to a page
+FILE_MAGIC = b"QTAB"
+FILE_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGN = 4096
+
+
+def write_header(f, encoder: ObsEncoder, num_actions: int, dtype) -> int:
+    """
+    Write the header describing the table layout, returns the offset of the values
+    """
+    header = json.dumps({**encoder.layout(), "num_actions": num_actions,
+                         "dtype": np.dtype(dtype).str}).encode()
+    offset = -(-(_PREAMBLE.size + len(header)) // _ALIGN) * _ALIGN
+    f.write(_PREAMBLE.pack(FILE_MAGIC, FILE_VERSION, len(header)))
+    f.write(header)
+    f.write(b"\0" * (offset - _PREAMBLE.size - len(header)))
+    return offset
+
+
+def read_header(path: str) -> tuple[dict, int]:
+    """
+    Returns the header and the offset of the values of a Q-table file
+    """
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a Q-table file")
+        if version != FILE_VERSION:
+            raise ValueError(f"Unsupported Q-table file version {version} in {path}, expected {FILE_VERSION}")  # noqa
+        header = json.loads(f.read(header_len))
+    offset = -(-(_PREAMBLE.size + header_len) // _ALIGN) * _ALIGN
+    return header, offset
+
+
+class DenseQTable:
+    """
+    Q-values of every (state, action) in one contiguous array, indexed by ObsEncoder state index.
+    The array is a memory map, of a Q-table file at `path` to keep it or of an anonymous temporary
+    file, so only the pages of visited states take memory however large the observation space is.
+    Read-only tables share the page cache, several processes can evaluate the same file.
+    """
+
+    def __init__(self, encoder: ObsEncoder, num_actions: int, path: Optional[str] = None, dtype=np.float32, read_only=False):  # noqa
+        """
+        path: Q-table file, opened if it exists (its layout must match) or created
+        """
+        self.encoder = encoder
+        self.num_actions = num_actions
+        self.path = path
+        shape = (encoder.num_states, num_actions)
+        if path is None:
+            self._file = tempfile.TemporaryFile()
+            self.values = np.memmap(self._file, dtype=dtype, mode="w+", shape=shape)
+            return
+
+        if not os.path.exists(path):
+            if read_only:
+                raise FileNotFoundError(f"Q-table file {path} not found")
+            with open(path, "wb") as f:
+                offset = write_header(f, encoder, num_actions, dtype)
+                f.truncate(offset + encoder.num_states * num_actions * np.dtype(dtype).itemsize)
+        header, offset = read_header(path)
+        if {**encoder.layout(), "num_actions": num_actions} != {k: header[k] for k in ["keys", "starts", "sizes", "num_actions"]}:  # noqa
+            raise ValueError(f"Q-table file {path} does not match the observation space")
+        self.values = np.memmap(path, dtype=np.dtype(header["dtype"]), mode="r" if read_only else "r+",
+                                offset=offset, shape=shape)
+
+    @classmethod
+    def open(cls, path: str, read_only=True) -> "DenseQTable":
+        """
+        Open a Q-table file with the layout of its header, no observation space needed
+        """
+        header, _ = read_header(path)
+        encoder = ObsEncoder.from_layout(header["keys"], header["starts"], header["sizes"])
+        return cls(encoder, header["num_actions"], path=path, dtype=np.dtype(header["dtype"]), read_only=read_only)  # noqa
+
+    @classmethod
+    def from_dict(cls, q_values: dict, encoder: ObsEncoder, num_actions: int, path: str) -> "DenseQTable":
+        """
+        Write the Q-values of a TrafficLightQAgent, keyed by sorted observation tuples, to a Q-table file.
+        The file is written next to `path` and renamed into place.
+        Rows that were never updated (all zeros, e.g. created by reading the defaultdict) are skipped.
+        An observation outside the space is clipped into a state, it never overwrites the row of the
+        observation of that state itself.
+        """
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        table = cls(encoder, num_actions, path=tmp_path)
+        exact_states = set()
+        for obs_key, values in q_values.items():
+            if not np.any(values):
+                continue
+            obs = dict(obs_key)
+            state = encoder.encode(obs)
+            if state in exact_states:
+                continue
+            if encoder.decode(state) == obs:
+                exact_states.add(state)
+            table.values[state] = values
+        table.flush()
+        del table
+        os.replace(tmp_path, path)
+        return cls(encoder, num_actions, path=path)
+
+    def __getitem__(self, state: int) -> np.ndarray:
+        return self.values[state]
+
+    def flush(self):
+        if self.values.mode != "r":
+            self.values.flush()
@@ -0,0 +1,298 @@
+import math
+from typing import Optional
+import numpy as np
+
+from simulator.car_engine import CarEngine
+from simulator.config import game_config
+from simulator.street import Lane, Street
+
+# same palette as Environment.COLORS
+COLORS = {
+    "WHITE": (255, 255, 255),
+    "RED": (255, 0, 0),
+    "GREEN": (0, 255, 0),
+    "YELLOW": (255, 255, 0),
+    "BACKGROUND": (68, 80, 99),
+    "ROAD": (47, 52, 64),
+    "LANE_LINE": (255, 255, 255),
+    "DIVIDER": (41, 96, 92),
+}
+car_width = 10  # Car.width
+
+
+class Rasterizer:
+    """
+    Headless renderer writing frames straight into uint8 (height, width, 3) arrays, no pygame or SDL.
+    Draws what Environment draws, except the lane signs and text: roads, lane lines, dividers,
+    lights, intersection paths and cars. Turning cars are drawn as their bounding box.
+    Renders a batch of worlds with the same layout at once, cars are read from their lanes
+    or, when a CarEngine is given, straight from the engine arrays.
+    """
+
+    def __init__(self, worlds_streets: list[list[Street]], width: Optional[int] = None, height: Optional[int] = None):  # noqa
+        """
+        worlds_streets: the streets of every world, laid out like config.create_streets
+        width, height: of the frames, the screen size by default, the layout is scaled to it
+        """
+        self.worlds_streets = worlds_streets
+        self.num_worlds = len(worlds_streets)
+        self.width = width if width is not None else game_config["screen_width"]
+        self.height = height if height is not None else game_config["screen_height"]
+        self.sx = self.width / game_config["screen_width"]
+        self.sy = self.height / game_config["screen_height"]
+
+        # tracks cars drive on: every lane, then every intersection path that is drawn
+        streets = worlds_streets[0]
+        lanes = [lane for st in streets for lane in st.approach_lanes + st.exit_lanes]
+        paths = [lane for st in streets for lane in st.approach_lanes if self._is_drawn_path(lane)]
+        self.num_lanes = len(lanes)
+        params = [self._lane_params(lane) for lane in lanes] + [self._path_params(lane) for lane in paths]
+        # car position is a + b * travel_distance + c * car length, size from the rotation
+        self.ax, self.bx, self.cx, self.ay, self.by, self.cy, self.cos, self.sin = \
+            np.array(params, dtype=np.float64).T
+        # light of each lane with a light, and the path behind it (-1 if not drawn)
+        self.light_lanes = [i for i, lane in enumerate(lanes) if lane.is_approach and lane.light]
+        lane_ids = {id(lane): t for t, lane in enumerate(lanes)}
+        path_track = {lane_ids[id(lane)]: self.num_lanes + j for j, lane in enumerate(paths)}
+        self.light_path = np.array([path_track.get(i, -1) for i in self.light_lanes], dtype=np.int64)  # noqa
+
+        # lane / intersection of every world -> (world, track)
+        self.track_of: dict[int, tuple[int, int]] = {}
+        self.world_lanes: list[list[Lane]] = []
+        for w, world_streets in enumerate(worlds_streets):
+            world_lanes = [lane for st in world_streets for lane in st.approach_lanes + st.exit_lanes]
+            self.world_lanes.append(world_lanes)
+            for t, lane in enumerate(world_lanes):
+                self.track_of[id(lane)] = (w, t)
+                if t in path_track:
+                    self.track_of[id(lane.to_intsec)] = (w, path_track[t])
+        self.engine_tracks: Optional[tuple[np.ndarray, ...]] = None
+
+        self.background = self._render_background()
+        self.light_py, self.light_px, self.light_pid = self._pixels(
+            [self._rect(*self._light_rect(lanes[i])) for i in self.light_lanes])
+        self.path_py, self.path_px, self.path_pid = self._pixels(
+            [self._line(lane.right_x, lane.right_y, lane.to_intsec.to_lane.left_x, lane.to_intsec.to_lane.left_y)  # type: ignore # noqa
+             for lane in paths])
+
+    @staticmethod
+    def _is_drawn_path(lane: Lane) -> bool:
+        return lane.is_approach and lane.to_direction in ["through", "right"] and \
+            lane.to_intsec is not None and lane.to_intsec.to_lane is not None
+
+    @staticmethod
+    def _lane_params(lane: Lane):
+        """
+        Position of the cars on a lane, see Environment#_draw_cars_on_lane
+        """
+        x, y, w, length = lane.left_x, lane.left_y, lane.width, lane.street.length
+        di = lane.street.approach_direction
+        if di == "north":
+            return (x + w // 2 - 5, 0, 0, *((y + length, -1, 0) if lane.is_approach else (y, 1, -1)), 1, 0)
+        if di == "south":
+            return (x - w // 2 - 5, 0, 0, *((y - length, 1, -1) if lane.is_approach else (y, -1, 0)), 1, 0)
+        if di == "east":
+            return (*((x - length, 1, -1) if lane.is_approach else (x, -1, 0)), y + w // 2 - 5, 0, 0, 0, 1)
+        return (*((x + length, -1, 0) if lane.is_approach else (x, 1, -1)), y - w // 2 - 5, 0, 0, 0, 1)
+
+    @staticmethod
+    def _path_params(lane: Lane):
+        """
+        Position of the cars in the intersection behind a lane, see Environment#_draw_intersections
+        """
+        intsec = lane.to_intsec
+        assert intsec is not None and intsec.to_lane is not None
+        to_lane = intsec.to_lane
+        bx = (to_lane.left_x - lane.right_x) / intsec.length
+        by = (to_lane.left_y - lane.right_y) / intsec.length
+        w = lane.width
+        di = lane.street.approach_direction
+        if lane.to_direction == "through":
+            rot = 0 if di in ["north", "south"] else 90
+            offsets = {
+                "north": (-(w // 2 + car_width // 2), 0, 0, -1),
+                "west": (0, -1, w // 2 - car_width // 2, 0),
+                "south": (w // 2 - car_width // 2, 0, 0, 0),
+                "east": (0, 0, -(w // 2 + car_width // 2), 0),
+            }
+        else:
+            slope = abs(lane.right_x - to_lane.left_x) / abs(lane.right_y - to_lane.left_y)
+            rot = int(math.degrees(math.atan(slope)))
+            if di in ["north", "south"]:
+                rot = 180 - rot
+            offsets = {
+                "north": (-(w // 2 + car_width // 2), 0, 0, -1),
+                "west": (-(w // 2), -1, w // 2, -1),
+                "south": (w // 2 - car_width // 2, 0, 0, 0),
+                "east": (0, 0, -(w // 2 + car_width // 2), 0),
+            }
+        x0, cx, y0, cy = offsets[di]
+        rad = math.radians(rot)
+        return (lane.right_x + x0, bx, cx, lane.right_y + y0, by, cy, abs(math.cos(rad)), abs(math.sin(rad)))
+
+    @staticmethod
+    def _light_rect(lane: Lane):
+        x, y, w = lane.left_x, lane.left_y, lane.width
+        di = lane.street.approach_direction
+        if di == "north":
+            return (x, y - 5, w, 5)
+        if di == "south":
+            return (x - w + 1, y, w, 5)
+        if di == "east":
+            return (x, y + 1, 5, w)
+        return (x - 5, y - w, 5, w)
+
+    def _rect(self, x, y, w, h) -> tuple[slice, slice]:
+        """
+        Slices of a screen rect in the frame, at least one pixel wide
+        """
+        x0, y0 = int(x * self.sx), int(y * self.sy)
+        x1, y1 = max(x0 + 1, int((x + w) * self.sx)), max(y0 + 1, int((y + h) * self.sy))
+        return slice(max(y0, 0), min(y1, self.height)), slice(max(x0, 0), min(x1, self.width))
+
+    def _line(self, ax, ay, bx, by) -> tuple[np.ndarray, np.ndarray]:
+        n = int(max(abs(bx - ax) * self.sx, abs(by - ay) * self.sy)) + 1
+        xs = np.clip((np.linspace(ax, bx, n) * self.sx).astype(np.int64), 0, self.width - 1)
+        ys = np.clip((np.linspace(ay, by, n) * self.sy).astype(np.int64), 0, self.height - 1)
+        return ys, xs
+
+    def _pixels(self, shapes: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Flatten rects (slices) or lines (coordinates) into pixel coordinates and the shape of each pixel
+        """
+        ys, xs, ids = [], [], []
+        for i, shape in enumerate(shapes):
+            if isinstance(shape[0], slice):
+                yy, xx = np.mgrid[shape]
+                yy, xx = yy.ravel(), xx.ravel()
+            else:
+                yy, xx = shape
+            ys.append(yy)
+            xs.append(xx)
+            ids.append(np.full(len(yy), i, dtype=np.int64))
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(ys), np.concatenate(xs), np.concatenate(ids)
+
+    def _render_background(self) -> np.ndarray:
+        """
+        The static layer: background, roads, lane lines and dividers
+        """
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = COLORS["BACKGROUND"]
+        for st in self.worlds_streets[0]:
+            if st.approach_direction in ["north", "south"]:
+                frame[self._rect(st.x, st.y, st.width, st.length)] = COLORS["ROAD"]
+            else:
+                frame[self._rect(st.x, st.y, st.length, st.width)] = COLORS["ROAD"]
+            for lane in st.approach_lanes + st.exit_lanes:
+                for x, y in [(lane.left_x, lane.left_y), (lane.right_x, lane.right_y)]:
+                    if st.approach_direction == "north":
+                        frame[self._rect(x, y, 1, st.length + 1)] = COLORS["LANE_LINE"]
+                    elif st.approach_direction == "south":
+                        frame[self._rect(x, y - st.length, 1, st.length + 1)] = COLORS["LANE_LINE"]
+                    elif st.approach_direction == "east":
+                        frame[self._rect(x - st.length, y, st.length + 1, 1)] = COLORS["LANE_LINE"]
+                    else:
+                        frame[self._rect(x, y, st.length + 1, 1)] = COLORS["LANE_LINE"]
+            last = st.approach_lanes[-1]
+            dw = st.divider_width
+            if st.approach_direction == "north":
+                frame[self._rect(last.right_x + 1, st.y, dw - 1, st.length)] = COLORS["DIVIDER"]
+            elif st.approach_direction == "south":
+                frame[self._rect(last.right_x - dw, st.y, dw, st.length)] = COLORS["DIVIDER"]
+            elif st.approach_direction == "east":
+                frame[self._rect(st.x, last.right_y + 1, st.length, dw - 1)] = COLORS["DIVIDER"]
+            else:
+                frame[self._rect(st.x, last.right_y - dw + 1, st.length, dw - 1)] = COLORS["DIVIDER"]
+        return frame
+
+    def _gather_cars(self):
+        """
+        (world, track, travel_distance, length, color) of every drawn car, read from the lanes
+        """
+        worlds, tracks, travel, length, colors = [], [], [], [], []
+        for w, world_lanes in enumerate(self.world_lanes):
+            for t, lane in enumerate(world_lanes):
+                queues = [(t, lane.cars)]
+                if id(lane.to_intsec) in self.track_of:
+                    queues.append((self.track_of[id(lane.to_intsec)][1], lane.to_intsec.cars))  # type: ignore
+                for track, cars in queues:
+                    for car in cars:
+                        worlds.append(w)
+                        tracks.append(track)
+                        travel.append(car.travel_distance)
+                        length.append(car.length)
+                        colors.append(car.color)
+        return (np.array(worlds, dtype=np.int64), np.array(tracks, dtype=np.int64),
+                np.array(travel, dtype=np.float64), np.array(length, dtype=np.float64),
+                np.array(colors, dtype=np.uint8).reshape(-1, 3))
+
+    def _gather_engine_cars(self, engine: CarEngine):
+        """
+        Same as #_gather_cars(), read at once from the engine arrays
+        """
+        if self.engine_tracks is None or len(self.engine_tracks[0]) != len(engine.lanes) \
+                or len(self.engine_tracks[2]) != len(engine.intsecs):
+            no_track = (-1, -1)
+            lane_wt = np.array([self.track_of.get(id(lane), no_track) for lane in engine.lanes], dtype=np.int64).reshape(-1, 2)  # noqa
+            intsec_wt = np.array([self.track_of.get(id(i), no_track) for i in engine.intsecs], dtype=np.int64).reshape(-1, 2)  # noqa
+            self.engine_tracks = (lane_wt[:, 0], lane_wt[:, 1], intsec_wt[:, 0], intsec_wt[:, 1])
+        lane_world, lane_track, intsec_world, intsec_track = self.engine_tracks
+        idx = np.flatnonzero(engine.alive[:engine.high_water])
+        in_intsec = engine.in_intsec[idx]
+        lane, intsec = engine.lane[idx], engine.intsec[idx]
+        worlds = np.where(in_intsec, intsec_world[intsec], lane_world[lane])
+        tracks = np.where(in_intsec, intsec_track[intsec], lane_track[lane])
+        # cars of other worlds, or turning left
+        keep = tracks >= 0
+        idx = idx[keep]
+        return worlds[keep], tracks[keep], engine.travel[idx], engine.length[idx], engine.color[idx]
+
+    def render(self, out: Optional[np.ndarray] = None, car_engine: Optional[CarEngine] = None) -> np.ndarray:
+        """
+        Draw the current state of every world into `out`, a (num_worlds, height, width, 3) uint8 array
+        that is allocated if not given.
+        car_engine: read the cars from the engine of the worlds instead of their lanes
+        """
+        if out is None:
+            out = np.empty((self.num_worlds, self.height, self.width, 3), dtype=np.uint8)
+        out[:] = self.background
+
+        # lights, and the path behind every light that is not red
+        light_colors = np.array([[COLORS[lanes[i].light.color.upper()] for i in self.light_lanes]  # type: ignore
+                                 for lanes in self.world_lanes], dtype=np.uint8).reshape(self.num_worlds, -1, 3)  # noqa
+        out[:, self.light_py, self.light_px] = light_colors[:, self.light_pid]
+        is_red = (light_colors == COLORS["RED"]).all(axis=2)
+        visible = np.zeros((self.num_worlds, len(self.ax)), dtype=bool)
+        visible[:, :self.num_lanes] = True
+        has_path = self.light_path >= 0
+        visible[:, self.light_path[has_path]] = ~is_red[:, has_path]
+        w, p = np.nonzero(visible[:, self.num_lanes + self.path_pid])
+        out[w, self.path_py[p], self.path_px[p]] = COLORS["WHITE"]
+
+        # cars, as rectangles from their top left corner
+        worlds, tracks, travel, length, colors = \
+            self._gather_engine_cars(car_engine) if car_engine is not None else self._gather_cars()
+        shown = visible[worlds, tracks]
+        worlds, tracks, travel, length, colors = \
+            worlds[shown], tracks[shown], travel[shown], length[shown], colors[shown]
+        if len(worlds) == 0:
+            return out
+        cos, sin = self.cos[tracks], self.sin[tracks]
+        x = self.ax[tracks] + self.bx[tracks] * travel + self.cx[tracks] * length
+        y = self.ay[tracks] + self.by[tracks] * travel + self.cy[tracks] * length
+        x0, y0 = np.floor(x * self.sx).astype(np.int64), np.floor(y * self.sy).astype(np.int64)
+        x1 = np.maximum(x0 + 1, np.floor((x + car_width * cos + length * sin) * self.sx).astype(np.int64))
+        y1 = np.maximum(y0 + 1, np.floor((y + car_width * sin + length * cos) * self.sy).astype(np.int64))
+        x0, x1 = np.clip(x0, 0, self.width), np.clip(x1, 0, self.width)
+        y0, y1 = np.clip(y0, 0, self.height), np.clip(y1, 0, self.height)
+        max_w, max_h = int((x1 - x0).max()), int((y1 - y0).max())
+        if max_w <= 0 or max_h <= 0:
+            return out
+        # every car covers the pixels of a max_h x max_w grid inside its rect
+        dy, dx = np.mgrid[:max_h, :max_w]
+        inside = (dx[None] < (x1 - x0)[:, None, None]) & (dy[None] < (y1 - y0)[:, None, None])
+        c, py, px = np.nonzero(inside)
+        out[worlds[c], y0[c] + py, x0[c] + px] = colors[c]
+        return out
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from typing import Optional
+import pygame
+
+from simulator.environment import Environment
+from simulator.timer import VirtualClock
+from simulator.world import World, create_world
+
+# (clock_ms, light colors, cars), cars are (in_intsec, queue index, travel_distance, length, width, color)
+WorldSnapshot = tuple[float, tuple[str, ...], tuple[tuple, ...]]
+
+
+class WorldSnapshotter:
+    """
+    Takes immutable snapshots of what Environment draws from a world, and applies them to another
+    world with the same layout (e.g. a mirror owned by a render thread)
+    """
+
+    def __init__(self, world: World):
+        self.world = world
+        self.light_names = list(world.lights.keys())
+        self.lanes = [lane for st in world.streets for lane in st.approach_lanes + st.exit_lanes]
+        self.intsecs = [lane.to_intsec for st in world.streets for lane in st.approach_lanes
+                        if lane.to_intsec is not None]
+
+    def take(self) -> WorldSnapshot:
+        cars = []
+        for i, lane in enumerate(self.lanes):
+            for car in lane.cars:
+                cars.append((False, i, car.travel_distance, car.length, car.width, car.color))
+        for i, intsec in enumerate(self.intsecs):
+            for car in intsec.cars:
+                cars.append((True, i, car.travel_distance, car.length, car.width, car.color))
+        lights = tuple(self.world.lights[name].color for name in self.light_names)
+        return self.world.clock.get_ticks(), lights, tuple(cars)
+
+    def apply(self, snapshot: WorldSnapshot):
+        clock_ms, lights, cars = snapshot
+        self.world.clock.now_ms = clock_ms  # type: ignore
+        for name, color in zip(self.light_names, lights):
+            self.world.lights[name].color = color
+        lanes_cars: list[list[CarSprite]] = [[] for _ in self.lanes]
+        intsecs_cars: list[list[CarSprite]] = [[] for _ in self.intsecs]
+        for in_intsec, i, travel_distance, length, width, color in cars:
+            (intsecs_cars if in_intsec else lanes_cars)[i].append(CarSprite(travel_distance, length, width, color))  # noqa
+        # Environment only iterates and counts the cars
+        for lane, lane_cars in zip(self.lanes, lanes_cars):
+            lane.cars = lane_cars  # type: ignore
+        for intsec, intsec_cars in zip(self.intsecs, intsecs_cars):
+            intsec.cars = intsec_cars  # type: ignore
+
+
+class CarSprite:
+    """
+    The drawable part of a Car
+    """
+    __slots__ = ["travel_distance", "length", "width", "color", "x", "y", "rotate"]
+
+    def __init__(self, travel_distance, length, width, color):
+        self.travel_distance = travel_distance
+        self.length = length
+        self.width = width
+        self.color = color
+
+    def set_geo(self, x, y, rotate=0):
+        self.x = x
+        self.y = y
+        self.rotate = rotate
+
+
+class SnapshotBuffer:
+    """
+    Double buffer of the latest snapshot: the writer fills the back slot and swaps,
+    the reader only gets a snapshot newer than the last one it drew
+    """
+
+    def __init__(self):
+        self.slots: list[Optional[WorldSnapshot]] = [None, None]
+        self.front = 0
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def publish(self, snapshot: WorldSnapshot):
+        back = 1 - self.front
+        self.slots[back] = snapshot
+        with self.lock:
+            self.front = back
+            self.seq += 1
+
+    def latest(self, after_seq: int) -> tuple[int, Optional[WorldSnapshot]]:
+        with self.lock:
+            if self.seq == after_seq:
+                return after_seq, None
+            return self.seq, self.slots[self.front]
+
+
+class RenderThread(threading.Thread):
+    """
+    Draws the latest published snapshot at its own frame rate, stale snapshots are skipped.
+    The simulation never waits for rendering.
+    Opens the pygame display and pumps its events off the main thread, which SDL supports
+    on Linux and Windows but not on macOS.
+    """
+
+    def __init__(self, buffer: SnapshotBuffer, width: int, height: int, fps: int):
+        super().__init__(name="RenderThread", daemon=True)
+        self.buffer = buffer
+        self.size = (width, height)
+        self.fps = fps
+        self.stopped = threading.Event()
+        self.frames = 0
+
+    def run(self):
+        pygame.init()
+        os.environ['SDL_VIDEO_WINDOW_POS'] = "%d,%d" % (0, 0)
+        pygame.display.set_caption('Traffic Intersection Simulation')
+        screen = pygame.display.set_mode(self.size)
+        clock = pygame.time.Clock()
+
+        mirror = create_world(VirtualClock())
+        snapshotter = WorldSnapshotter(mirror)
+        environment = Environment(screen, mirror.streets, clock=mirror.clock, dirty_rects=True)
+        seq = 0
+        while not self.stopped.is_set():
+            pygame.event.pump()
+            seq, snapshot = self.buffer.latest(seq)
+            if snapshot is not None:
+                snapshotter.apply(snapshot)
+                environment.next_tick()
+                environment.draw_text(f"Frame: {clock.get_rawtime()}ms", 10, 30, 0)  # noqa
+                pygame.display.update(environment.dirty_rects)
+                self.frames += 1
+            clock.tick(self.fps)
+        pygame.display.quit()
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stopped.set()
+        self.join(timeout)
+
+
+class AsyncRenderer:
+    """
+    Publishes snapshots of a world at most `fps` times per wall-clock second to a RenderThread
+    """
+
+    def __init__(self, world: World, width: int, height: int, fps: int):
+        self.snapshotter = WorldSnapshotter(world)
+        self.buffer = SnapshotBuffer()
+        self.min_interval_s = 1 / fps
+        self.last_publish_s = 0.0
+        self.thread = RenderThread(self.buffer, width, height, fps)
+        self.thread.start()
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if force or now - self.last_publish_s >= self.min_interval_s:
+            self.last_publish_s = now
+            self.buffer.publish(self.snapshotter.take())
+
+    def close(self):
+        self.thread.stop()
@@ -0,0 +1,79 @@
+from typing import Optional
+import numpy as np
+
+from simulator.street import Intersection, Lane, Street
+
+
+class AliasTable:
+    """
+    Walker's alias method: after O(n) setup every draw from the discrete distribution
+    is O(1), one uniform index and one coin flip, however many outcomes there are
+    """
+
+    def __init__(self, weights: list[float]):
+        w = np.asarray(weights, dtype=np.float64)
+        if len(w) == 0 or (w < 0).any() or w.sum() <= 0:
+            raise ValueError(f"Alias table needs non-negative weights with a positive sum, got {weights}")
+        n = len(w)
+        scaled = w * n / w.sum()
+        # full columns keep prob 1, also the leftovers of float noise below
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        # Vose: pair every under-full column with an over-full one
+        while small and large:
+            s = small.pop()
+            g = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] -= 1 - scaled[s]
+            (small if scaled[g] < 1 else large).append(g)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        i = rng.integers(len(self.prob), size=size)
+        return np.where(rng.random(size) < self.prob[i], i, self.alias[i])
+
+
+# (street, to_street, approach lane, intersection)
+Route = tuple[Street, Street, Lane, Intersection]
+
+
+class RouteTable:
+    """
+    Every route a car can take, precomputed once per scenario: origin street, destination street
+    and one approach lane whose turn leads there. Routes are drawn in batches with an AliasTable.
+
+    od_weights: relative demand of every (origin, destination) approach direction pair,
+        e.g. {("north", "south"): 3, ("north", "east"): 1}, unlisted pairs get no cars.
+        By default every possible pair is equally likely. The demand of a pair is spread evenly
+        over its lanes.
+    """
+
+    def __init__(self, streets: list[Street], turn_directions: dict[tuple[str, str], str],
+                 od_weights: Optional[dict[tuple[str, str], float]] = None):
+        self.routes: list[Route] = []
+        weights: list[float] = []
+        possible = set()
+        for street in streets:
+            for to_street in streets:
+                turn = (street.approach_direction, to_street.approach_direction)
+                if to_street == street or turn not in turn_directions:
+                    continue
+                lanes = [lane for lane in street.approach_lanes if lane.to_direction == turn_directions[turn]]
+                if len(lanes) == 0:
+                    continue
+                possible.add(turn)
+                weight = od_weights.get(turn, 0) if od_weights is not None else 1
+                for lane in lanes:
+                    self.routes.append((street, to_street, lane, lane.to_intsec))  # type: ignore
+                    weights.append(weight / len(lanes))
+        if od_weights is not None:
+            impossible = [turn for turn, weight in od_weights.items() if weight > 0 and turn not in possible]
+            if impossible:
+                raise ValueError(f"No route for the origin-destination pairs {impossible}")
+        self.alias_table = AliasTable(weights)
+
+    def sample(self, rng: np.random.Generator, size: int) -> list[Route]:
+        routes = self.routes
+        return [routes[i] for i in self.alias_table.sample(rng, size).tolist()]
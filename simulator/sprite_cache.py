@@ -0,0 +1,37 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+import pygame
+
+
+class SpriteCache:
+    """
+    Bounded LRU cache of rendered surfaces, e.g. keyed by (size, color, rotation)
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.sprites: OrderedDict[Hashable, pygame.Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, render: Callable[[], pygame.Surface]) -> pygame.Surface:
+        """
+        The cached surface of `key`, rendered with `render` on a miss
+        """
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = render()
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.capacity:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+
+    def __len__(self):
+        return len(self.sprites)
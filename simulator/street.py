@@ -3,15 +3,112 @@ import math
 from typing import Optional
 from simulator.car import Car
 from simulator.lights_control.light import Light
+from simulator.trip_stats import TripStats
+
+
+class CarQueue:
+    """
+    Cars in driving order (first is the front car), linked through Car.leader and Car.follower.
+    Entering, leaving and finding the front car are all O(1).
+
+    Also keeps running KPIs of its cars, updated when a car enters, leaves, stops or starts,
+    so they can be read without walking the cars.
+    """
+
+    def __init__(self):
+        self.head: Optional[Car] = None
+        self.tail: Optional[Car] = None
+        self.size = 0
+        self.num_stopped = 0
+        self.total_waiting_ms = 0.0
+
+    def get_snapshot(self) -> tuple:
+        """
+        The links to the cars and the KPIs, the cars keep their own links, see Car#get_snapshot()
+        """
+        return self.head, self.tail, self.size, self.num_stopped, self.total_waiting_ms
+
+    def set_snapshot(self, state: tuple):
+        self.head, self.tail, self.size, self.num_stopped, self.total_waiting_ms = state
+
+    def update_stopped(self, was_stopped: bool, is_stopped: bool):
+        self.num_stopped += int(is_stopped) - int(was_stopped)
+
+    def update_waiting_ms(self, delta_ms: float):
+        self.total_waiting_ms += delta_ms
+
+    def append(self, car: Car):
+        car.queue = self
+        self.update_stopped(False, car.current_speed < 1)
+        self.update_waiting_ms(car.updated_waiting_ms)
+        car.leader = self.tail
+        car.follower = None
+        if self.tail is not None:
+            self.tail.follower = car
+        else:
+            self.head = car
+        self.tail = car
+        self.size += 1
+
+    def remove(self, car: Car):
+        if car.leader is not None:
+            car.leader.follower = car.follower
+        else:
+            self.head = car.follower
+        if car.follower is not None:
+            car.follower.leader = car.leader
+        else:
+            self.tail = car.leader
+        car.leader = None
+        car.follower = None
+        self.size -= 1
+        car.queue = None
+        self.update_stopped(car.current_speed < 1, False)
+        self.update_waiting_ms(-car.updated_waiting_ms)
+
+    def __iter__(self):
+        car = self.head
+        while car is not None:
+            # the car may leave the queue while being visited
+            next_car = car.follower
+            yield car
+            car = next_car
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i: int) -> Car:
+        """
+        O(1) for the first and the last car, O(n) otherwise
+        """
+        if i < 0:
+            i += self.size
+        if i == 0 and self.head is not None:
+            return self.head
+        if i == self.size - 1 and self.tail is not None:
+            return self.tail
+        if i < 0 or i >= self.size:
+            raise IndexError("CarQueue index out of range")
+        for j, car in enumerate(self):
+            if j == i:
+                return car
+        raise IndexError("CarQueue index out of range")
 
 
 class Intersection:
     def __init__(self):
-        self.cars: list[Car] = []
+        self.cars = CarQueue()
         self.length = 10
 
     def reset(self):
-        self.cars = []
+        self.cars = CarQueue()
+
+    def get_snapshot(self) -> tuple:
+        return self.cars, self.cars.get_snapshot()
+
+    def set_snapshot(self, state: tuple):
+        self.cars, queue_state = state
+        self.cars.set_snapshot(queue_state)
 
     def set_from_lane(self, from_lane):
         self.from_lane: Lane = from_lane
@@ -45,8 +142,12 @@ class Lane:
         # left, left_right, left_through_right, left_through, left, right, through_right, through
         self.to_direction = to_direction
         self.light = light
-        self.cars: list[Car] = []
+        self.cars = CarQueue()
+        # passed cars are only counted, unless keep_passed_cars is set
+        self.num_passed_cars = 0
+        self.keep_passed_cars = False
         self.passed_cars: list[Car] = []
+        self.trip_stats: Optional[TripStats] = None
         self.to_intsec = to_intsec
         self.from_intsecs = from_intsecs
 
@@ -58,15 +159,31 @@ class Lane:
                 intsec.set_to_lane(self)
 
     def reset(self):
-        self.cars = []
+        self.cars = CarQueue()
+        self.num_passed_cars = 0
         self.passed_cars = []
 
+    def get_snapshot(self) -> tuple:
+        """
+        The queue object is kept, a reset replaces it, see #set_snapshot()
+        """
+        return self.cars, self.cars.get_snapshot(), self.num_passed_cars, self.passed_cars, len(self.passed_cars)
+
+    def set_snapshot(self, state: tuple):
+        self.cars, queue_state, self.num_passed_cars, self.passed_cars, num_kept = state
+        self.cars.set_snapshot(queue_state)
+        del self.passed_cars[num_kept:]
+
     def add_car(self, car):
         self.cars.append(car)
 
     def remove_car(self, car):
         self.cars.remove(car)
-        self.passed_cars.append(car)
+        self.num_passed_cars += 1
+        if self.keep_passed_cars:
+            self.passed_cars.append(car)
+        if self.is_approach and self.trip_stats is not None:
+            self.trip_stats.record_passed()
 
     def get_cars(self):
         return self.cars
@@ -101,8 +218,8 @@ class Lane:
         Return an array of each bin of the lane and whether it is occupied
         """
         ql = self.get_queue_length()
-        # 0:0, 1-4:1, 5-8:2
-        ql = math.ceil(ql / 4)
+        # 0:0, 1-4:1, 5+:2, longer queues than max_queue_length(8) end the episode
+        ql = min(math.ceil(ql / 4), self.get_state_space() - 1)
         # avg_waiting = int(self.get_avg_waiting_time() / 1000)
         # 0:0, 1-10:1, 11-20:2, 21-30:3, 31-40:4
         # avg_waiting = math.ceil(ql / 10)
@@ -118,14 +235,13 @@ class Lane:
         """
         Get real-time queue length
         """
-        queue_length = 0
-        for car in self.cars:
-            if car.current_speed < 1:
-                queue_length += 1
-        return queue_length
+        return self.cars.num_stopped
+
+    def get_total_waiting_time(self):
+        return self.cars.total_waiting_ms
 
     def get_avg_waiting_time(self):
-        total_waiting_ms = sum([car.updated_waiting_ms for car in self.cars])
+        total_waiting_ms = self.cars.total_waiting_ms
 
         return total_waiting_ms / len(self.cars) if len(self.cars) > 0 else 0
 
@@ -136,6 +252,21 @@ class Lane:
         #     num_cars += 1
         # return total_speed / num_cars if num_cars > 0 else 0
 
+    def check_kpis(self):
+        """
+        Debug: cross-check the running KPIs against a full recomputation
+        """
+        queue_length = 0
+        total_waiting_ms = 0
+        for car in self.cars:
+            if car.current_speed < 1:
+                queue_length += 1
+            total_waiting_ms += car.updated_waiting_ms
+        if queue_length != self.cars.num_stopped or \
+                not math.isclose(total_waiting_ms, self.cars.total_waiting_ms, abs_tol=1e-3):
+            raise ValueError(
+                f"Lane KPIs out of sync: queue_length={self.cars.num_stopped} expected {queue_length}, total_waiting_ms={self.cars.total_waiting_ms} expected {total_waiting_ms}")  # noqa
+
 
 class Street:
     STREET_ID_COUNTER = 0
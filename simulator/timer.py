@@ -16,6 +16,24 @@ class CustomClock:
         now = time.get_ticks()
         return (now - self.world_start) * self.speed
 
+    def advance(self, steps=1):
+        """
+        Wall time moves on its own, nothing to do
+        """
+        return self.get_ticks()
+
+    def get_snapshot(self) -> tuple:
+        return self.get_ticks(), self.paused_at_raw is not None
+
+    def set_snapshot(self, state: tuple):
+        """
+        Continue from the saved world time, wall time keeps moving from there
+        """
+        ticks, paused = state
+        now = time.get_ticks()
+        self.world_start = now - ticks / self.speed
+        self.paused_at_raw = now if paused else None
+
     def pause_clock(self):
         self.paused_at_raw = time.get_ticks()
 
@@ -29,15 +47,88 @@ class CustomClock:
             self.paused_at_raw = None
 
 
-CustomClock_INSTANCE = CustomClock(speed=1)
+class VirtualClock:
+    """
+    Fixed-timestep clock, simulated time only moves forward when #advance() is called.
+    The simulation runs as fast as the CPU allows and the same seed gives the same
+    results regardless of machine load.
+    """
+
+    def __init__(self, dt_ms: float = 1000 / 60, speed=1):
+        self.dt_ms = dt_ms
+        self.speed = speed
+        self.now_ms: float = 0
+        self.paused = False
+
+    def get_ticks(self):
+        """
+        Return current simulated time in milliseconds
+        """
+        return self.now_ms
+
+    def advance(self, steps=1):
+        """
+        Move simulated time forward by `steps` * dt_ms, with the speed factor applied
+        """
+        if not self.paused:
+            self.now_ms += self.dt_ms * self.speed * steps
+        return self.now_ms
 
+    def get_snapshot(self) -> tuple:
+        return self.now_ms, self.paused
 
-def set_clock(speed=1):
+    def set_snapshot(self, state: tuple):
+        self.now_ms, self.paused = state
+
+    def jump_to(self, ms: float):
+        """
+        Move simulated time straight to `ms`, e.g. to the next event of an event-driven simulation
+        """
+        if not self.paused and ms > self.now_ms:
+            self.now_ms = ms
+        return self.now_ms
+
+    def pause_clock(self):
+        self.paused = True
+
+    def resume_clock(self):
+        """
+        Nothing is lost while paused, just allow #advance() again
+        """
+        self.paused = False
+
+
+WorldClock = CustomClock | VirtualClock
+
+CustomClock_INSTANCE: WorldClock = CustomClock(speed=1)
+
+
+def set_clock(speed=1, dt_ms: Optional[float] = None):
+    """
+    Replace the world clock, pass `dt_ms` to use a VirtualClock
+    """
     global CustomClock_INSTANCE
-    CustomClock_INSTANCE = CustomClock(speed)
+    if dt_ms is not None:
+        CustomClock_INSTANCE = VirtualClock(dt_ms, speed)
+    else:
+        CustomClock_INSTANCE = CustomClock(speed)
 
 
 def clock():
     if not CustomClock_INSTANCE:
         raise ValueError("Clock not set, use set_clock() first")
     return CustomClock_INSTANCE
+
+
+def new_clock(headless=False) -> WorldClock:
+    """
+    Create an independent clock configured like the global one, e.g. one per world.
+    A CustomClock reads pygame ticks, which stay at 0 until a display initialises pygame:
+    headless worlds get a VirtualClock at the global speed instead, advanced one 60 fps frame per step.
+    """
+    global_clock = clock()
+    if isinstance(global_clock, VirtualClock):
+        return VirtualClock(global_clock.dt_ms, global_clock.speed)
+    if headless:
+        return VirtualClock(speed=global_clock.speed)
+    return CustomClock(global_clock.speed)
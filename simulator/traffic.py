@@ -1,8 +1,12 @@
 from typing import Optional
 from simulator.car import Car
+from simulator.car_engine import CarEngine
+from simulator.routes import RouteTable
 from simulator.street import Street
-from simulator.timer import clock
+from simulator.trip_stats import TripStats
+from simulator import timer
 import random
+import numpy as np
 
 
 class Traffic:
@@ -24,59 +28,146 @@ class Traffic:
         ('west', 'south'): 'right'
     }
 
-    def __init__(self, time_scale: int, streets: list[Street], cars_config, game_config) -> None:
+    def __init__(self, time_scale: int, streets: list[Street], cars_config, game_config,
+                 car_engine: Optional[CarEngine] = None, keep_cars=False, debug_kpis=False,
+                 clock: Optional[timer.WorldClock] = None) -> None:
+        """
+        Traffic reads its own clock (defaults to the global one) and draws from its own seeded RNG.
+        Pass a CarEngine to keep cars in NumPy arrays and advance them in one vectorized update.
+        Finished trips are only accounted in `stats`, set keep_cars to also keep every finished
+        Car in `finished_cars` and every passed Car in `Lane.passed_cars`.
+        Set debug_kpis to cross-check the running lane KPIs with a full recomputation every tick.
+        Routes are drawn from a RouteTable, weighted by cars_config["od_weights"] if set.
+        """
         self.time_scale = time_scale
+        self.clock = clock if clock is not None else timer.clock()
+        self.rng = random.Random()
+        # draws the routes of the spawned cars in batches
+        self.route_rng = np.random.default_rng()
         self.streets = streets
         self.cars_config = cars_config
+        self.route_table = RouteTable(streets, Traffic.turn_directions, cars_config.get("od_weights"))
         self.num_spawned_cars = 0
         self.game_config = game_config
-        self.all_cars: list[Car] = []
+        # insertion-ordered set of the cars on the streets, finished cars are dropped in O(1)
+        self.all_cars: dict[Car, None] = {}
+        self.keep_cars = keep_cars
+        self.debug_kpis = debug_kpis
         self.finished_cars: list[Car] = []
+        self.stats = TripStats()
         self.last_spawn_ms = 0
 
         self.acc_cars_to_spawn = 0
 
+        for street in streets:
+            for lane in street.approach_lanes + street.exit_lanes:
+                lane.keep_passed_cars = keep_cars
+                lane.trip_stats = self.stats
+
+        self.car_engine = car_engine
+        if car_engine is not None:
+            car_engine.register_streets(streets)
+
+    def seed(self, seed: Optional[int] = None):
+        self.rng.seed(seed)
+        self.route_rng = np.random.default_rng(seed)
+
     def reset(self, seed: Optional[int] = None):
-        random.seed(seed)
+        self.seed(seed)
 
         self.num_spawned_cars = 0
-        self.all_cars = []
         self.finished_cars = []
+        self.stats.reset()
         self.last_spawn_ms = 0
+        self.acc_cars_to_spawn = 0
+        self.last_clock_ms = self.clock.get_ticks()
+        if self.car_engine is not None:
+            # the engine may be shared with other Traffic instances, only drop our cars
+            self.car_engine.reset_streets(self.streets, self.all_cars)  # type: ignore
+        self.all_cars = {}
         for street in self.streets:
             street.reset()
 
+    def get_snapshot(self) -> tuple:
+        """
+        Compact snapshot of the traffic, its cars, lanes and intersections: tuples of values and
+        references to the existing objects, nothing is deep-copied. Restore it with #set_snapshot(),
+        as often as needed. Cars spawned after the snapshot are dropped on restore.
+        A CarEngine is restored as a whole, including the cars of other Traffic instances sharing it.
+        """
+        queues = tuple((lane, lane.get_snapshot()) for st in self.streets for lane in st.approach_lanes + st.exit_lanes)  # noqa
+        intsecs = tuple((lane.to_intsec, lane.to_intsec.get_snapshot()) for st in self.streets
+                        for lane in st.approach_lanes if lane.to_intsec is not None)
+        return (self.rng.getstate(), self.num_spawned_cars, self.last_spawn_ms, self.acc_cars_to_spawn,
+                self.__dict__.get("last_clock_ms"), tuple(self.all_cars), tuple(car.get_snapshot() for car in self.all_cars),  # noqa
+                queues, intsecs, self.stats.get_snapshot(), self.finished_cars, len(self.finished_cars),
+                self.car_engine.get_snapshot() if self.car_engine is not None else None,
+                self.route_rng.bit_generator.state)
+
+    def set_snapshot(self, state: tuple):
+        (rng_state, self.num_spawned_cars, self.last_spawn_ms, self.acc_cars_to_spawn, last_clock_ms, all_cars,
+         cars_state, queues, intsecs, stats_state, self.finished_cars, num_finished, engine_state,
+         route_rng_state) = state
+        self.rng.setstate(rng_state)
+        self.route_rng.bit_generator.state = route_rng_state
+        if last_clock_ms is not None:
+            self.last_clock_ms = last_clock_ms
+        # the engine first, the cars it keeps in arrays are restored with it
+        if engine_state is not None:
+            self.car_engine.set_snapshot(engine_state)  # type: ignore
+        self.all_cars = dict.fromkeys(all_cars)
+        for car, car_state in zip(all_cars, cars_state):
+            car.set_snapshot(car_state)
+        for lane, lane_state in queues:
+            lane.set_snapshot(lane_state)
+        for intsec, intsec_state in intsecs:
+            intsec.set_snapshot(intsec_state)
+        self.stats.set_snapshot(stats_state)
+        del self.finished_cars[num_finished:]
+
     def _spawn_car(self):
-        num_new_cars = 1
-        # spawn cars on a random street and start at the beginning of the street
-        num_car_generated = 0
-        while num_car_generated < num_new_cars:
-            street = random.choice(self.streets)
-            # random choose to_street from the rest of the streets
-            to_street = random.choice(
-                [st for st in self.streets if st != street])
-
-            turn = (street.approach_direction, to_street.approach_direction)
-            if turn not in Traffic.turn_directions:
-                # skip if the turn is not possible
-                continue
-
-            current_lane = random.choice(
-                [lane for lane in street.approach_lanes if lane.to_direction ==
-                    Traffic.turn_directions[turn]]
-            )
-            to_intsec = current_lane.to_intsec
-
-            car = Car(street, current_lane, to_street, to_intsec,
-                      game_config=self.game_config, init_speed=self.cars_config["init_speed"])
-            self.all_cars.append(car)
-            current_lane.cars.append(car)
-            num_car_generated += 1
-            self.last_spawn_ms = clock().get_ticks()
-        self.num_spawned_cars += num_car_generated
+        self._spawn_batch(1)
+
+    def _spawn_batch(self, num_cars: int):
+        """
+        Spawn cars at the beginning of their approach lanes, the routes are drawn in one go
+        """
+        for street, to_street, current_lane, to_intsec in self.route_table.sample(self.route_rng, num_cars):
+            if self.car_engine is not None:
+                car = self.car_engine.spawn(street, current_lane, to_street, to_intsec,
+                                            game_config=self.game_config, init_speed=self.cars_config["init_speed"],
+                                            clock=self.clock, rng=self.rng)
+            else:
+                car = Car(street, current_lane, to_street, to_intsec,
+                          game_config=self.game_config, init_speed=self.cars_config["init_speed"],
+                          clock=self.clock, rng=self.rng)
+                current_lane.add_car(car)
+            self.all_cars[car] = None
+        self.last_spawn_ms = self.clock.get_ticks()
+        self.num_spawned_cars += num_cars
 
     def next_tick(self):
-        clock_ms = clock().get_ticks()
+        clock_ms = self.clock.get_ticks()
+        self.spawn_cars()
+
+        if self.car_engine is not None:
+            finished_cars = self.car_engine.next_tick(clock_ms)
+            for car in finished_cars:
+                self.finish_car(car, clock_ms)
+        else:
+            # finished after the loop, the cars must not change while they are iterated
+            finished_cars = [car for car in self.all_cars if car.next_tick()]
+            for car in finished_cars:
+                self.finish_car(car, clock_ms)
+
+        if self.debug_kpis:
+            self.check_kpis()
+        return clock_ms
+
+    def spawn_cars(self):
+        """
+        Spawn the cars due since the last tick, cars_per_min spread evenly over time
+        """
         cars_per_min = self.cars_config["cars_per_min"]
 
         # calculate step in minutes
@@ -87,22 +178,29 @@ class Traffic:
         num_cars_to_spawn = self.acc_cars_to_spawn + cars_per_step
         if num_cars_to_spawn >= 1:
             self.acc_cars_to_spawn = num_cars_to_spawn % 1
-            num_cars_to_spawn = int(num_cars_to_spawn)
-            for _ in range(num_cars_to_spawn):
-                self._spawn_car()
+            self._spawn_batch(int(num_cars_to_spawn))
         else:
             # delegate number of cars to spawn to next step until it reaches >= 1
             self.acc_cars_to_spawn += cars_per_step
 
-        for car in self.all_cars:
-            recycle_car = car.next_tick()
-            if recycle_car:
-                self.finished_cars.append(car)
-                self.all_cars.remove(car)
-        return clock_ms
+    def check_kpis(self):
+        for street in self.streets:
+            for lane in street.approach_lanes + street.exit_lanes:
+                lane.check_kpis()
+
+    def finish_car(self, car: Car, clock_ms: float):
+        """
+        Account the trip of a car that left the simulation
+        """
+        travel_ms = clock_ms - car.spawned_ms
+        delay_ms = max(0, travel_ms - car.free_flow_ms)
+        self.stats.record_trip(car.movement, travel_ms, delay_ms, car.stops)
+        if self.keep_cars:
+            self.finished_cars.append(car)
+        del self.all_cars[car]
 
     def _get_step_ms(self):
-        clock_ms = clock().get_ticks()
+        clock_ms = self.clock.get_ticks()
 
         if 'last_clock_ms' not in self.__dict__:
             self.last_clock_ms = clock_ms
@@ -118,8 +216,7 @@ class Traffic:
         total_waiting_ms = 0
         for street in self.streets:
             for lane in street.approach_lanes:
-                for car in lane.cars:
-                    total_waiting_ms += car.updated_waiting_ms
+                total_waiting_ms += lane.get_total_waiting_time()
 
         return total_waiting_ms
 
@@ -135,9 +232,13 @@ class Traffic:
         return total_queue_length
 
     def calc_passed_cars(self):
-        total_passed_cars = 0
-        for street in self.streets:
-            for lane in street.approach_lanes:
-                total_passed_cars += len(lane.passed_cars)
+        """
+        Number of cars that passed the stop line of an approach lane
+        """
+        return self.stats.num_passed
 
-        return total_passed_cars
+    def calc_finished_cars(self):
+        """
+        Number of cars that left the simulation
+        """
+        return self.stats.count
@@ -0,0 +1,93 @@
+class TripAggregate:
+    """
+    Streaming aggregates of finished trips, constant memory however many cars finish
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_travel_ms = 0.0
+        self.max_travel_ms = 0.0
+        self.total_delay_ms = 0.0
+        self.total_stops = 0
+
+    def add(self, travel_ms: float, delay_ms: float, stops: int):
+        self.count += 1
+        self.total_travel_ms += travel_ms
+        self.max_travel_ms = max(self.max_travel_ms, travel_ms)
+        self.total_delay_ms += delay_ms
+        self.total_stops += stops
+
+    def get_snapshot(self) -> tuple:
+        return self.count, self.total_travel_ms, self.max_travel_ms, self.total_delay_ms, self.total_stops
+
+    def set_snapshot(self, state: tuple):
+        self.count, self.total_travel_ms, self.max_travel_ms, self.total_delay_ms, self.total_stops = state
+
+    def avg_travel_ms(self):
+        return self.total_travel_ms / self.count if self.count > 0 else 0
+
+    def avg_delay_ms(self):
+        return self.total_delay_ms / self.count if self.count > 0 else 0
+
+    def avg_stops(self):
+        return self.total_stops / self.count if self.count > 0 else 0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "avg_travel_ms": self.avg_travel_ms(),
+            "max_travel_ms": self.max_travel_ms,
+            "avg_delay_ms": self.avg_delay_ms(),
+            "avg_stops": self.avg_stops(),
+        }
+
+
+class TripStats:
+    """
+    Trip accounting for a Traffic: counters and streaming aggregates instead of
+    keeping every finished Car. Movements are keyed like the lane observations,
+    e.g. "north_left" is a car that approached from the north in the left lane.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # cars that left an approach lane, i.e. passed the stop line
+        self.num_passed = 0
+        self.total = TripAggregate()
+        self.movements: dict[str, TripAggregate] = {}
+
+    def get_snapshot(self) -> tuple:
+        return self.num_passed, self.total.get_snapshot(), tuple((k, v.get_snapshot()) for k, v in self.movements.items())  # noqa
+
+    def set_snapshot(self, state: tuple):
+        self.num_passed, total_state, movements = state
+        self.total.set_snapshot(total_state)
+        self.movements = {}
+        for movement, movement_state in movements:
+            self.movements[movement] = TripAggregate()
+            self.movements[movement].set_snapshot(movement_state)
+
+    @property
+    def count(self):
+        """
+        Number of cars that finished their trip
+        """
+        return self.total.count
+
+    def record_passed(self):
+        self.num_passed += 1
+
+    def record_trip(self, movement: str, travel_ms: float, delay_ms: float, stops: int):
+        self.total.add(travel_ms, delay_ms, stops)
+        if movement not in self.movements:
+            self.movements[movement] = TripAggregate()
+        self.movements[movement].add(travel_ms, delay_ms, stops)
+
+    def to_dict(self):
+        return {
+            "num_passed": self.num_passed,
+            **self.total.to_dict(),
+            "movements": {k: v.to_dict() for k, v in self.movements.items()},
+        }
@@ -0,0 +1,161 @@
+import io
+import os
+import pickle
+import random
+
+from simulator import log
+from simulator.timer import VirtualClock
+
+logger = log.get_logger("warm_start")
+
+
+def world_objects(env) -> list:
+    """
+    Objects of an env that a state refers to but does not own, in an order every env with the
+    same layout agrees on: the clock, configs, car engine, streets, lanes, intersections and lights
+    """
+    world = env.world
+    lanes = [lane for st in world.streets for lane in st.approach_lanes + st.exit_lanes]
+    intsecs = [lane.to_intsec for st in world.streets for lane in st.approach_lanes if lane.to_intsec is not None]  # noqa
+    return [world.clock, env.traffic.game_config, env.traffic.cars_config, env.traffic.car_engine,
+            *world.streets, *lanes, *intsecs, *world.lights.values()]
+
+
+class _StatePickler(pickle.Pickler):
+    def __init__(self, file, objects: list):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.object_ids = {id(obj): i for i, obj in enumerate(objects) if obj is not None}
+
+    def persistent_id(self, obj):
+        return self.object_ids.get(id(obj))
+
+
+class _StateUnpickler(pickle.Unpickler):
+    def __init__(self, file, objects: list):
+        super().__init__(file)
+        self.objects = objects
+
+    def persistent_load(self, pid):
+        return self.objects[pid]
+
+
+def dump_state(env, state: tuple) -> bytes:
+    """
+    Serialize a state of TrafficSimulatorEnv#get_state(), the cars and queues are copied,
+    the world objects are stored as references, see #load_state()
+    """
+    f = io.BytesIO()
+    _StatePickler(f, world_objects(env)).dump(state)
+    return f.getvalue()
+
+
+def load_state(env, data: bytes) -> tuple:
+    """
+    A state of #dump_state() bound to the world of `env`, which may be another env with the same layout
+    """
+    return _StateUnpickler(io.BytesIO(data), world_objects(env)).load()
+
+
+class WarmStartPool:
+    """
+    Pre-simulated traffic states to start episodes from, instead of empty streets.
+    Built once per (scenario, demand, engine, seed range) by driving an env with a fixed-cycle
+    policy past its warm-up, then sampled by TrafficSimulatorEnv#reset(options={"warm_start": True}).
+    """
+    suffix = ".warm.pkl"
+
+    def __init__(self, key: dict, states: list[bytes]):
+        self.key = key
+        self.states = states
+
+    @staticmethod
+    def make_key(env, scenario: str, seeds: range) -> dict:
+        return {
+            "scenario": scenario,
+            "cars_per_min": env.traffic.cars_config["cars_per_min"],
+            "engine": env.engine,
+            "seeds": (seeds.start, seeds.stop, seeds.step),
+        }
+
+    @staticmethod
+    def file_name(key: dict) -> str:
+        start, stop, step = key["seeds"]
+        return f"{key['scenario']}_{key['cars_per_min']}cpm_{key['engine']}_seeds{start}-{stop}-{step}" + WarmStartPool.suffix  # noqa
+
+    @classmethod
+    def build(cls, env, seeds: range, scenario="default", warmup_s=30.0, samples_per_seed=4, sample_every_s=5.0,
+              switch_every_s=10.0) -> "WarmStartPool":
+        """
+        For every seed: reset, cycle through the phases every `switch_every_s` until `warmup_s`,
+        then keep a state every `sample_every_s`. Episodes that terminate early keep fewer states.
+        """
+        if not isinstance(env.world.clock, VirtualClock):
+            raise ValueError("Building a warm start pool needs an env with a VirtualClock")
+        key = cls.make_key(env, scenario, seeds)
+        frame_s = env._frame_ms() / 1000
+        switch_frames = max(1, round(switch_every_s / frame_s))
+        warmup_frames = round(warmup_s / frame_s)
+        sample_frames = max(1, round(sample_every_s / frame_s))
+        num_phases = len(env.lights_phases_config)
+
+        states: list[bytes] = []
+        for seed in seeds:
+            env.reset(seed=seed)
+            frame = 0
+            num_samples = 0
+            while num_samples < samples_per_seed:
+                action = (frame // switch_frames) % num_phases
+                _, terminated = env._step_frame(action)
+                frame += 1
+                if terminated:
+                    break
+                if frame >= warmup_frames and (frame - warmup_frames) % sample_frames == 0:
+                    states.append(dump_state(env, env.get_state()))
+                    num_samples += 1
+        if len(states) == 0:
+            raise ValueError(f"No state survived the warm-up of {warmup_s}s, shorten it")
+        logger.info("built %d warm start states for %s", len(states), cls.file_name(key))
+        return cls(key, states)
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((self.key, self.states), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "WarmStartPool":
+        with open(path, "rb") as f:
+            key, states = pickle.load(f)
+        return cls(key, states)
+
+    @classmethod
+    def load_or_build(cls, env, folder="./warm_start/", seeds: range = range(32), scenario="default",
+                      **build_kwargs) -> "WarmStartPool":
+        """
+        Load the pool of this scenario, demand, engine and seed range from `folder`, build and save it
+        the first time. Building resets and steps `env`.
+        """
+        path = os.path.join(folder, cls.file_name(cls.make_key(env, scenario, seeds)))
+        if os.path.exists(path):
+            return cls.load(path)
+        pool = cls.build(env, seeds, scenario=scenario, **build_kwargs)
+        os.makedirs(folder, exist_ok=True)
+        pool.save(path)
+        return pool
+
+    def check(self, env):
+        """
+        Raise if the states were simulated with another demand or engine than `env`
+        """
+        for name, value in [("cars_per_min", env.traffic.cars_config["cars_per_min"]), ("engine", env.engine)]:
+            if self.key[name] != value:
+                raise ValueError(f"Warm start pool has {name}={self.key[name]}, the env has {value}")
+
+    def sample(self, rng: random.Random) -> bytes:
+        return self.states[rng.randrange(len(self.states))]
+
+    def __len__(self):
+        return len(self.states)
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from simulator import timer
+from simulator.config import create_streets
+from simulator.geometry import layout
+from simulator.lights_control.light import Light, create_lights
+from simulator.street import Street
+
+
+class World:
+    """
+    Everything one simulation mutates: streets, lanes, intersections, lights and the clock.
+    Worlds share nothing, so many simulations can run in one process.
+    """
+
+    def __init__(self, streets: list[Street], lights: dict[str, Light], clock: timer.WorldClock):
+        self.streets = streets
+        self.lights = lights
+        self.clock = clock
+
+
+def create_world(clock: Optional[timer.WorldClock] = None) -> World:
+    """
+    Build an independent intersection with its own clock (configured like the global one by default)
+    """
+    lights = create_lights()
+    streets = create_streets(lights)
+    layout(streets)
+    return World(streets, lights, clock if clock is not None else timer.new_clock())
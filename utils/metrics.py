@@ -0,0 +1,141 @@
+import glob
+import json
+import os
+from typing import Optional
+import numpy as np
+
+
+class RingBuffer:
+    """
+    The last `capacity` values in a fixed-size array, plus running totals of everything appended
+    """
+
+    def __init__(self, capacity: int):
+        self.values = np.zeros(capacity)
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.next_i = 0
+        self.size = 0
+        # since the last clear, not only the values kept
+        self.count = 0
+        self.total = 0.0
+
+    def append(self, value: float):
+        self.values[self.next_i] = value
+        self.next_i = (self.next_i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.count += 1
+        self.total += value
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.count += len(values)
+        self.total += float(values.sum())
+        values = values[-self.capacity:]
+        end = self.next_i + len(values)
+        if end <= self.capacity:
+            self.values[self.next_i:end] = values
+        else:
+            split = self.capacity - self.next_i
+            self.values[self.next_i:] = values[:split]
+            self.values[:end - self.capacity] = values[split:]
+        self.next_i = end % self.capacity
+        self.size = min(self.size + len(values), self.capacity)
+
+    def last(self, n: Optional[int] = None) -> np.ndarray:
+        """
+        The last n values (all kept values by default), oldest first
+        """
+        n = self.size if n is None else min(n, self.size)
+        return self.values[np.arange(self.next_i - n, self.next_i) % self.capacity]
+
+    def mean(self, n: Optional[int] = None) -> float:
+        return float(self.last(n).mean()) if self.size > 0 else float("nan")
+
+    def __len__(self):
+        return self.size
+
+    def __array__(self, dtype=None, copy=None):
+        return self.last().astype(dtype) if dtype is not None else self.last()
+
+
+class EWMA:
+    """
+    Exponentially weighted moving average, `alpha` is the weight of the newest value
+    """
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value = float("nan")
+
+    def update(self, value: float) -> float:
+        self.value = value if self.value != self.value else self.alpha * value + (1 - self.alpha) * self.value  # nan check # noqa
+        return self.value
+
+
+class MetricsLog:
+    """
+    Append-only columnar log of per-episode records: one float64 file per column in `folder`,
+    records are buffered and appended in batches. Read the whole history with #read_metrics().
+    """
+    schema_file = "columns.json"
+
+    def __init__(self, folder: str, columns: list[str], batch_size=100, resume=False):
+        """
+        resume: append to the records in `folder`, by default they are removed
+        """
+        self.folder = folder
+        self.columns = columns
+        self.batch_size = batch_size
+        self.batch = np.zeros((batch_size, len(columns)))
+        self.batch_len = 0
+        os.makedirs(folder, exist_ok=True)
+        schema_path = os.path.join(folder, self.schema_file)
+        if not resume:
+            for column_file in glob.glob(os.path.join(folder, "*.f64")) + [schema_path]:
+                if os.path.exists(column_file):
+                    os.remove(column_file)
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                if json.load(f) != columns:
+                    raise ValueError(f"Metrics log {folder} has other columns than {columns}")
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(columns, f)
+
+    def append(self, record: dict[str, float]):
+        self.batch[self.batch_len] = [record[c] for c in self.columns]
+        self.batch_len += 1
+        if self.batch_len >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch_len == 0:
+            return
+        for j, column in enumerate(self.columns):
+            with open(os.path.join(self.folder, f"{column}.f64"), "ab") as f:
+                f.write(self.batch[:self.batch_len, j].tobytes())
+        self.batch_len = 0
+
+    def close(self):
+        self.flush()
+
+
+def read_metrics(folder: str, start=0) -> dict[str, np.ndarray]:
+    """
+    Read a MetricsLog from record `start` on, columns are cut to the rows every column has
+    """
+    with open(os.path.join(folder, MetricsLog.schema_file)) as f:
+        columns: list[str] = json.load(f)
+    paths = [os.path.join(folder, f"{c}.f64") for c in columns]
+    rows = min((os.path.getsize(p) // 8 if os.path.exists(p) else 0) for p in paths)
+    start = min(start, rows)
+    metrics = {}
+    for column, path in zip(columns, paths):
+        if rows == start:
+            metrics[column] = np.zeros(0)
+            continue
+        metrics[column] = np.array(np.memmap(path, dtype=np.float64, mode="r", offset=start * 8, shape=(rows - start,)))  # noqa
+    return metrics
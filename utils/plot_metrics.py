@@ -1,10 +1,22 @@
 import os
+import signal
+import sys
+import time
+from typing import Optional
+import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 
+from utils.metrics import read_metrics
 
-def plot_metrics(rewards: list[float], errors: list[float], key: str, show=False):
-    df = pd.DataFrame({'Rewards': rewards, 'Errors': errors})
+
+def plot_metrics(rewards: list[float], errors: list[float], key: str, show=False,
+                 episodes: Optional[list[float]] = None):
+    """
+    episodes: x values of the points, e.g. when the metrics are downsampled, defaults to 0, 1, 2...
+    """
+    df = pd.DataFrame({'Rewards': rewards, 'Errors': errors}, index=episodes)
 
     # Create a plot with two y-axes
     fig, ax1 = plt.subplots(figsize=(10, 5))  # Create a figure and an axes.
@@ -33,9 +45,57 @@ def plot_metrics(rewards: list[float], errors: list[float], key: str, show=False
     # Save and show the plot
     if not os.path.exists('training_logs/'):
         os.makedirs('training_logs/')
-    plt.savefig(f'training_logs/{key}.pdf')
+    # write next to the chart and rename, a viewer never sees a half written file
+    plt.savefig(f'training_logs/{key}.tmp.pdf')
+    os.replace(f'training_logs/{key}.tmp.pdf', f'training_logs/{key}.pdf')
     if show:
         plt.show()
 
     fig.clear()
     plt.close(fig)
+
+
+def downsample(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Means of `max_points` consecutive bins of the values
+    """
+    if len(values) <= max_points:
+        return values
+    return np.array([b.mean() for b in np.array_split(values, max_points)])
+
+
+def watch_metrics(folder: str, key: str, every_s: float, max_points: int):
+    """
+    Re-plot the metrics log every `every_s` seconds when it has new records, once more on SIGTERM
+    """
+    stop = False
+
+    def on_term(signum, frame):
+        nonlocal stop
+        stop = True
+    signal.signal(signal.SIGTERM, on_term)
+
+    plotted_rows = 0
+    last_plot = 0.0
+    while True:
+        if stop or time.monotonic() - last_plot >= every_s:
+            last_plot = time.monotonic()
+            if os.path.exists(os.path.join(folder, "columns.json")):
+                history = read_metrics(folder)
+                rows = len(history["episode"])
+                if rows > plotted_rows:
+                    plotted_rows = rows
+                    plot_metrics(downsample(history["mean_reward"], max_points).tolist(),
+                                 downsample(history["avg_error"], max_points).tolist(), key,
+                                 episodes=downsample(history["episode"], max_points).tolist())
+        if stop:
+            return
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    # usage: python -m utils.plot_metrics [metrics_folder] [every_s] [max_points]
+    matplotlib.use("Agg")
+    watch_metrics(sys.argv[1] if len(sys.argv) > 1 else "training_logs/metrics/", "metrics",
+                  float(sys.argv[2]) if len(sys.argv) > 2 else 30,
+                  int(sys.argv[3]) if len(sys.argv) > 3 else 2000)